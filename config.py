@@ -4,7 +4,25 @@ dbname_stock = '/workbench/historicalData/venv/saveHistoricalData/data/historica
 dbname_termstructure = '/workbench/historicalData/venv/saveHistoricalData/data/termstructure.db'
 #dbname_analysisOptimizations = '/workbench/historicalData/venv/analysisOptimizations.db'
 dbname_analysisOptimizations = 'analysisOptimizations.db'
+dbname_pxCache = 'pxCache' # directory of the columnar px history cache
+dbname_barStore = 'barStore' # directory of the memory-mapped OHLCV store
+
+############# Data layer
+
+usePxCache = True # serve px history from the columnar cache when it is up to date
+usePxMemoryCache = True # keep loaded px history in the in-process LRU, independent of usePxCache
+pxCache_maxBytes = 512*1024**2 # size of the in-process px history LRU
+sqlite_mmapSize = 1024**3 # bytes of the db file pooled readers memory-map 
+sqlite_cacheSizeKb = 256*1024 # page cache per pooled reader
+sqlite_inMemory = False # batch runs: copy each db into memory on its first read and serve read-only connections from the copy
+
+############# Analysis
+
+momoOptimizer_numWorkers = None # worker processes of the universe momo period optimizer, None for one per cpu
+momoOptimizer_batchSize = 20 # symbols saved per transaction by the universe momo period optimizer
 
 ############### Reference Lists
 
 _indexList = ['VIX', 'VIX3M', 'VVIX', 'SPX', 'VIX1D', 'TSX']
+_exchangeHolidays = [] # 'YYYY-MM-DD' dates the exchange is closed on weekdays, excluded from business days in the calendar index
+_sessionHours = ('09:30', '16:00') # regular trading hours [open, close) used for the calendar session flag
@@ -1,10 +1,15 @@
 import config 
+import hashlib
+import time
+import numpy as np
 import pandas as pd 
 import matplotlib.pyplot as plt
 import statsmodels.formula.api as smf
 from interface import interface_analysisOptimizations as ao 
+from interface import interface_universe
 
-from ast import literal_eval
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
 from rich import print
 from utils import utils
 
@@ -16,16 +21,89 @@ from utils import utils
         shift: (optional) number of periods to shift momo
 """
 def calcMomoFactor(universe, lag=1, shift=1, lagmomo=False):
-    returns = universe.groupby('symbol', group_keys=False).apply(lambda group: (
-    group.sort_values(by='date')
-         .assign(momo=lambda x: (x['close'] / x['close'].shift(lag)) - 1,
-                 lagmomo=lambda x: x['momo'].shift(shift))
-        )
-    ).reset_index(drop=True)
-    if lagmomo == False:
-        returns.drop(columns=['lagmomo'], inplace=True)
+    returns, block = calcMomoFactors(universe, [lag], shift=shift, lagmomo=lagmomo, dtype=None)
+    returns['momo'] = block[:, 0]
+    if lagmomo:
+        returns['lagmomo'] = block[:, 1]
     return returns
 
+"""
+    Calculates momentum factor for several lags in one pass 
+    inputs:
+        universe: dataframe of px history with date and close columns, panels of several symbols have a symbol column
+        lags: [int] lookback periods 
+        shift: (optional) number of periods to shift lagged momo
+        lagmomo: also return lagged momo for every lag
+        dtype: dtype of the block, None for the dtype of close 
+    outputs:
+        pxHistory: universe sorted by symbol and date, rows of the block 
+        block: (records x lags) momo, followed by (records x lags) lagged momo if lagmomo, NaN where a symbol has no record lag periods back
+"""
+def calcMomoFactors(universe, lags, shift=1, lagmomo=False, dtype='float32'):
+    pxHistory = _sortBySymbolAndDate(universe)
+    close = pxHistory['close'].to_numpy()
+    if not np.issubdtype(close.dtype, np.floating):
+        close = close.astype('float64')
+
+    # position of every record in its symbol's block of rows
+    if 'symbol' in pxHistory.columns and len(pxHistory) > 0:
+        symbols = pxHistory['symbol'].to_numpy()
+        newBlock = np.ones(len(pxHistory), dtype=bool)
+        newBlock[1:] = symbols[1:] != symbols[:-1]
+        blockStarts = np.flatnonzero(newBlock)
+        blockLengths = np.diff(np.append(blockStarts, len(pxHistory)))
+        position = np.arange(len(pxHistory)) - np.repeat(blockStarts, blockLengths)
+        remaining = np.repeat(blockLengths, blockLengths) - position
+    else:
+        position = np.arange(len(pxHistory))
+        remaining = len(pxHistory) - position
+
+    lags = [int(lag) for lag in lags]
+    block = np.full((len(pxHistory), len(lags) * (2 if lagmomo else 1)), np.nan, dtype=dtype or close.dtype)
+    for i, lag in enumerate(lags):
+        momo = close / _shiftWithinBlocks(close, lag, position, remaining) - 1
+        block[:, i] = momo
+        if lagmomo:
+            block[:, len(lags) + i] = _shiftWithinBlocks(momo, int(shift), position, remaining)
+
+    return pxHistory, block
+
+""" same as Series.shift(periods) applied to every symbol's block of rows, see calcMomoFactors() """
+def _shiftWithinBlocks(values, periods, position, remaining):
+    shifted = np.full(len(values), np.nan, dtype=values.dtype)
+    if abs(periods) >= len(values):
+        return shifted
+    if periods >= 0:
+        shifted[periods:] = values[:len(values) - periods]
+        shifted[position < periods] = np.nan
+    else:
+        shifted[:periods] = values[-periods:]
+        shifted[remaining <= -periods] = np.nan
+    return shifted
+
+""" returns a copy of px history sorted by date, by symbol first for panels of several symbols, with a fresh index """
+def _sortBySymbolAndDate(universe):
+    if 'symbol' in universe.columns and universe['symbol'].nunique() > 1:
+        return universe.sort_values(by=['symbol', 'date'], kind='stable').reset_index(drop=True)
+    if universe['date'].is_monotonic_increasing:
+        return universe.reset_index(drop=True)
+    return universe.sort_values(by='date', kind='stable').reset_index(drop=True)
+
+"""
+    Adds a momo<lag> column for every lag that does not have one yet, see calcMomoFactors()
+    inputs:
+        pxHistory: dataframe of px history 
+        lags: [int] lookback periods 
+    outputs:
+        pxHistory sorted by symbol and date with the momo columns 
+"""
+def addMomoFactors(pxHistory, lags):
+    lags = [lag for lag in dict.fromkeys(lags) if 'momo%s'%(lag) not in pxHistory.columns]
+    pxHistory, block = calcMomoFactors(pxHistory, lags)
+    for i, lag in enumerate(lags):
+        pxHistory['momo%s'%(lag)] = block[:, i]
+    return pxHistory
+
 """
     Returns correlation between momoperiod and fwdreturnperiod 
 """
@@ -40,6 +118,148 @@ def calc_correlation(pxHistory_, momoPeriod, forwardReturnPeriod):
     
     return correl
 
+"""
+    Returns the close of each symbol in date order, one array per symbol 
+"""
+def _closeBySymbol(pxHistory):
+    if 'symbol' not in pxHistory.columns:
+        return [pxHistory.sort_values(by='date')['close'].to_numpy(dtype='float64')]
+    return [group.sort_values(by='date')['close'].to_numpy(dtype='float64') for _, group in pxHistory.groupby('symbol', sort=False)]
+
+"""
+    Returns the momo (close / close n periods ago - 1) of every period as a (records x periods) matrix, 
+    NaN where there is no close n periods back 
+"""
+def _momoMatrix(close, periods):
+    momo = np.full((len(close), len(periods)), np.nan)
+    for i, period in enumerate(periods):
+        momo[period:, i] = close[period:] / close[:-period] - 1
+    return momo
+
+"""
+    Returns the forward returns (close n periods ahead / close - 1) of every period as a (records x periods) matrix, 
+    NaN where there is no close n periods ahead 
+"""
+def _fwdReturnMatrix(close, periods):
+    fwdReturns = np.full((len(close), len(periods)), np.nan)
+    for i, period in enumerate(periods):
+        fwdReturns[:-period, i] = close[period:] / close[:-period] - 1
+    return fwdReturns
+
+"""
+    Returns the pearson correlation of every column of x with every column of y, each pair over the rows 
+    where both are not NaN (same as pandas Series.corr). Columns are centered first so the sums of 
+    products do not lose precision. 
+    inputs:
+        x: (records x n) matrix 
+        y: (records x m) matrix 
+    outputs:
+        (n x m) matrix of correlations, NaN for pairs with less than 2 common records
+"""
+def _nanCorrelation(x, y):
+    return _correlationFromSums(_pairSums(x, y))
+
+"""
+    Returns the sufficient statistics of the pearson correlation of every column of x with every column of y: 
+    n, sumX, sumY, sumXX, sumYY and sumXY of each pair over the rows where both are not NaN. Values are 
+    shifted by their column means (shiftX, shiftY) before summing, later records have to be shifted the same way. 
+"""
+def _pairSums(x, y):
+    shiftX, shiftY = _columnMeans(x), _columnMeans(y)
+    x, y = x - shiftX, y - shiftY
+    xValid, yValid = (~np.isnan(x)).astype('float64'), (~np.isnan(y)).astype('float64')
+    x, y = np.nan_to_num(x), np.nan_to_num(y)
+
+    return {
+        'shiftX': shiftX, 'shiftY': shiftY, 
+        'n': xValid.T @ yValid, 
+        'sumX': x.T @ yValid, 'sumY': xValid.T @ y, 
+        'sumXX': (x * x).T @ yValid, 'sumYY': xValid.T @ (y * y), 
+        'sumXY': x.T @ y,
+    }
+
+""" returns the mean of each column over its non NaN values, 0 for columns without any """
+def _columnMeans(x):
+    counts = (~np.isnan(x)).sum(axis=0)
+    return np.nansum(x, axis=0) / np.maximum(counts, 1)
+
+""" returns the matrix of pearson correlations from the sums of _pairSums() """
+def _correlationFromSums(sums):
+    n = sums['n']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        covariance = sums['sumXY'] - sums['sumX'] * sums['sumY'] / n
+        varianceX = sums['sumXX'] - sums['sumX']**2 / n
+        varianceY = sums['sumYY'] - sums['sumY']**2 / n
+        correl = covariance / np.sqrt(varianceX * varianceY)
+    correl[n < 2] = np.nan
+    return correl
+
+"""
+    Returns the correlation of momo and forward returns for every pair of periods, computed for 
+    all pairs at once from a momo matrix and a forward return matrix
+    inputs:
+        pxHistory: dataframe of px history with date and close columns, momo and forward returns are per symbol
+        momoPeriods: [int] momo lookback periods 
+        fwdReturnPeriods: [int] forward return periods 
+    outputs:
+        dataframe of correlations, index: momoPeriod, columns: fwdReturnPeriod
+"""
+def calcMomoCorrelationGrid(pxHistory, momoPeriods, fwdReturnPeriods):
+    return _momoCorrelations(_closeBySymbol(pxHistory), momoPeriods, fwdReturnPeriods)
+
+""" same as calcMomoCorrelationGrid, over the date ordered closes of one or more symbols """
+def _momoCorrelations(closes, momoPeriods, fwdReturnPeriods):
+    momoPeriods, fwdReturnPeriods = [int(period) for period in momoPeriods], [int(period) for period in fwdReturnPeriods]
+    momo = np.concatenate([_momoMatrix(close, momoPeriods) for close in closes])
+    fwdReturns = np.concatenate([_fwdReturnMatrix(close, fwdReturnPeriods) for close in closes])
+
+    correl = _nanCorrelation(momo, fwdReturns)
+    return pd.DataFrame(correl, index=pd.Index(momoPeriods, name='momoPeriod'), columns=pd.Index(fwdReturnPeriods, name='fwdReturnPeriod'))
+
+"""
+    Returns the running sums of the momo vs. fwd return correlation of every (momoPeriod, fwdReturnPeriod) pair 
+    over the date ordered close of one symbol, see _pairSums(). numBars is the number of closes folded in. 
+"""
+def _momoStats(close, momoPeriods, fwdReturnPeriods):
+    stats = _pairSums(_momoMatrix(close, momoPeriods), _fwdReturnMatrix(close, fwdReturnPeriods))
+    stats.update({'momoPeriods': np.asarray(momoPeriods), 'fwdReturnPeriods': np.asarray(fwdReturnPeriods), 'numBars': len(close)})
+    return stats
+
+"""
+    Folds the closes after the first stats['numBars'] into the running sums of _momoStats(). Each new close 
+    completes one (momo, fwd return) record per pair: the fwd return of period f that ends on the new close, 
+    and the momo of every period on the record it starts from. Updates take O(momoPeriods x fwdReturnPeriods) per close.
+    inputs:
+        stats: dict, see _momoStats(), updated in place
+        close: [float] date ordered close of the symbol, the first stats['numBars'] are the ones already folded in 
+"""
+def _updateMomoStats(stats, close):
+    momoPeriods, fwdReturnPeriods = stats['momoPeriods'], stats['fwdReturnPeriods']
+    for t in range(stats['numBars'], len(close)):
+        # record each fwd return period starts from, and the close of each momo period before it
+        starts = t - fwdReturnPeriods
+        lookbacks = starts[:, None] - momoPeriods[None, :]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            y = np.where(starts >= 0, close[t] / close[np.maximum(starts, 0)] - 1, np.nan) - stats['shiftY']
+            x = np.where(lookbacks >= 0, close[np.maximum(starts, 0)][:, None] / close[np.maximum(lookbacks, 0)] - 1, np.nan) - stats['shiftX'][None, :]
+
+        # (fwdReturnPeriods x momoPeriods) -> (momoPeriods x fwdReturnPeriods)
+        yValid, xValid = ~np.isnan(y), ~np.isnan(x)
+        y, x = np.nan_to_num(y)[:, None], np.nan_to_num(x)
+        valid = (xValid & yValid[:, None]).T
+        stats['n'] += valid
+        stats['sumX'] += np.where(valid, x.T, 0)
+        stats['sumY'] += np.where(valid, y.T, 0)
+        stats['sumXX'] += np.where(valid, (x * x).T, 0)
+        stats['sumYY'] += np.where(valid, (y * y).T, 0)
+        stats['sumXY'] += np.where(valid, (x * y).T, 0)
+    stats['numBars'] = len(close)
+    return stats
+
+""" returns the correlation grid of momo vs. fwd returns from the running sums of _momoStats() """
+def _momoStatsGrid(stats):
+    return pd.DataFrame(_correlationFromSums(stats), index=pd.Index(stats['momoPeriods'], name='momoPeriod'), columns=pd.Index(stats['fwdReturnPeriods'], name='fwdReturnPeriod'))
+
 """
     Returns the momoPeriod and fwdReturnPeriod combod with the highest correlation for the given pxHistory
 """
@@ -47,55 +267,154 @@ def _calc_optimized_momo_periods(pxHistory, top, **kwargs):
     momoPeriodMax = kwargs.get('momoPeriodMax', 361) # add 1 day
     fwdReturnPeriodMax = kwargs.get('fwdReturnPeriodMax', 361) # add 1 day
 
-    # make dataframe of momoPeriods and fwdReturnPeriods to calculate correlation for
-    correl = pd.DataFrame(columns=['momoPeriod', 'fwdReturnPeriod', 'correl'])
-    correl['momoPeriod'] = range(1, momoPeriodMax)
-    correl['fwdReturnPeriod'] = correl['momoPeriod'].apply(lambda x: range(1, fwdReturnPeriodMax)) 
-    correl = correl.explode('fwdReturnPeriod') # flatten the fwdReturnPeriod column
-    correl.reset_index(drop=True, inplace=True)
-
-    # calculate correlations 
+    # calculate correlations for every momoPeriod and fwdReturnPeriod pair
     starttimer = pd.Timestamp.now()
-    correl['correl'] = correl[['momoPeriod', 'fwdReturnPeriod']].apply(lambda x: calc_correlation(pxHistory, x['momoPeriod'], x['fwdReturnPeriod']), axis=1)
+    grid = calcMomoCorrelationGrid(pxHistory, range(1, momoPeriodMax), range(1, fwdReturnPeriodMax))
     print('[yellow]  correl dataframe cycle time:[/yellow] %.2fs'%(pd.Timestamp.now() - starttimer).total_seconds())
     
+    return _topCorrelations(grid, top)
+
+""" returns the top pairs of a correlation grid as a dataframe of [momoPeriod, fwdReturnPeriod, correl] """
+def _topCorrelations(grid, top):
+    correl = pd.DataFrame({'momoPeriod': np.repeat(grid.index, len(grid.columns)), 'fwdReturnPeriod': np.tile(grid.columns, len(grid.index)), 'correl': grid.to_numpy().ravel()})
+    
     # sort and return top values 
-    correl.sort_values(by='correl', ascending=False, inplace=True)
+    correl.sort_values(by='correl', ascending=False, inplace=True, kind='stable')
     return correl.head(top).reset_index(drop=True)
 
+""" close matrix of the universe being optimized, attached once per worker process, see optimizeUniverse() """
+_sharedCloses = None
+
+def _attachCloses(shmName, shape):
+    global _sharedCloses
+    shm = shared_memory.SharedMemory(name=shmName)
+    _sharedCloses = (shm, np.ndarray(shape, dtype='float64', buffer=shm.buf))
+
+""" worker - returns the top momo periods of one column of the shared close matrix, their running sums and the time it took """
+def _optimizeSymbol(column, top, momoPeriodMax, fwdReturnPeriodMax):
+    starttimer = time.perf_counter()
+    close = _sharedCloses[1][:, column]
+    # dates the symbol has no record for are NaN in the aligned matrix
+    close = close[~np.isnan(close)]
+    momoPeriods, fwdReturnPeriods = np.arange(1, momoPeriodMax), np.arange(1, fwdReturnPeriodMax)
+    stats = _momoStats(close, momoPeriods, fwdReturnPeriods)
+    fingerprint = _momoFingerprint(close, momoPeriods, fwdReturnPeriods)
+    return column, _topCorrelations(_momoStatsGrid(stats), top), stats, fingerprint, time.perf_counter() - starttimer
+
 """
-    This function returns a dataframe of momoPeriods and fwd returns that have the highest correlation
+    Optimizes momoPeriod and fwdReturnPeriod for every 1day symbol in the lookup table and saves the 
+    top periods to the analysis optimizations db, same as getTopMomoPeriods() does for a single symbol. 
+    The close of every symbol is loaded once into shared memory and the symbols are optimized by a pool of processes.
+    inputs:
+        symbols: [str] optional, symbols to optimize, defaults to every 1day symbol in the lookup table
+        top: int, number of top periods saved per symbol
+        numWorkers: int, number of worker processes, None for one per cpu
+        batchSize: int, number of symbols saved per db transaction
+        recalculate: bool, also optimize symbols that already have saved periods, replacing them
 """
-def getTopMomoPeriods(pxHistory, top=5, **kwargs):
+def optimizeUniverse(symbols=None, top=5, numWorkers=config.momoOptimizer_numWorkers, batchSize=config.momoOptimizer_batchSize, recalculate=False, **kwargs):
     momoPeriodMax = kwargs.get('rangeEnd', 362) # add 1 day
     fwdReturnPeriodMax = kwargs.get('fwdReturns', 362) # add 1 day
-
     analysis_name = 'opt_momo_fwdReturn'
 
-    # check if we have optimized variables already 
     optimization_db = ao.AnalysisOptimizationsDB(config.dbname_analysisOptimizations)
+    closes = interface_universe.Universe('1day', symbols=symbols)
 
-    opt_vars=optimization_db.get_analysis_variables(pxHistory['symbol'][0], analysis_name)
+    # skip symbols we have optimized variables for already
+    columns = list(range(len(closes.symbols)))
+    if not recalculate:
+        optimized = set(optimization_db.get_analysis_symbols(analysis_name))
+        columns = [column for column in columns if closes.symbols[column] not in optimized]
+    print('[yellow]Optimizing momo periods for %s symbols...[/yellow]'%(len(columns)))
 
-    if opt_vars is not None: # return optimized variables from db
+    starttimer = time.perf_counter()
+    shm = shared_memory.SharedMemory(create=True, size=max(closes.close.nbytes, 1))
+    try:
+        np.ndarray(closes.close.shape, dtype='float64', buffer=shm.buf)[:] = closes.close
+
+        with ProcessPoolExecutor(max_workers=numWorkers, initializer=_attachCloses, initargs=(shm.name, closes.close.shape)) as executor:
+            futures = [executor.submit(_optimizeSymbol, column, top, momoPeriodMax, fwdReturnPeriodMax) for column in columns]
+            batch, fingerprints = {}, {}
+            for future in as_completed(futures):
+                column, topPeriods, stats, fingerprint, seconds = future.result()
+                symbol = closes.symbols[column]
+                print('  %s:[green] optimized in %.2fs[/green]'%(symbol, seconds))
+                # saved in the same transaction as the batch of top periods
+                lastDate = str(pd.Timestamp(closes.dates[~np.isnan(closes.close[:, column])][-1]))
+                optimization_db.save_momo_stats(symbol, stats, lastDate, commit=False)
+                batch[symbol], fingerprints[symbol] = topPeriods, fingerprint
+                if len(batch) >= batchSize:
+                    optimization_db.save_opt_variables_batch(analysis_name, batch, fingerprints)
+                    batch, fingerprints = {}, {}
+            if batch:
+                optimization_db.save_opt_variables_batch(analysis_name, batch, fingerprints)
+    finally:
+        shm.close()
+        shm.unlink()
+        optimization_db.disconnect()
+
+    print('[yellow]  optimized %s symbols in[/yellow] %.2fs'%(len(columns), time.perf_counter() - starttimer))
+
+"""
+    This function returns a dataframe of momoPeriods and fwd returns that have the highest correlation. 
+    Saved variables are returned as is when they were computed on the same data, see _momoFingerprint(). 
+    Otherwise bars added since the last call are folded into the saved running sums behind the correlations 
+    instead of recomputing over the full history. 
+"""
+def getTopMomoPeriods(pxHistory, top=5, **kwargs):
+    momoPeriodMax = kwargs.get('rangeEnd', 362) # add 1 day
+    fwdReturnPeriodMax = kwargs.get('fwdReturns', 362) # add 1 day
+    momoPeriods, fwdReturnPeriods = np.arange(1, momoPeriodMax), np.arange(1, fwdReturnPeriodMax)
+
+    analysis_name = 'opt_momo_fwdReturn'
+    symbol = pxHistory['symbol'][0]
+    pxHistory = pxHistory.sort_values(by='date')
+    close = pxHistory['close'].to_numpy(dtype='float64')
+
+    # return optimized variables from db if they were computed on the same data 
+    optimization_db = ao.AnalysisOptimizationsDB(config.dbname_analysisOptimizations)
+    fingerprint = _momoFingerprint(close, momoPeriods, fwdReturnPeriods)
+    opt_vars = optimization_db.get_analysis_variables(symbol, analysis_name)
+    if opt_vars is not None and len(opt_vars) >= top and (opt_vars['fingerprint'] == fingerprint).all():
         print('[yellow]Getting top %s momo periods from db...[/yellow]'%(top))
-        # convert strings to lists
-        opt_vars['momoPeriod'] = opt_vars['momoPeriod'].apply(lambda x: literal_eval(x))
-        fwdReturnPeriods = opt_vars['fwdReturnPeriod'].apply(lambda x: literal_eval(x))[0]
-        # explode the lists into rows
-        opt_vars = opt_vars.explode('momoPeriod').reset_index(drop=True)
-        opt_vars['fwdReturnPeriod'] = opt_vars.apply(lambda row: fwdReturnPeriods[row.name], axis=1)
-        # calculcate correlation
-        opt_vars['correl'] = opt_vars[['momoPeriod', 'fwdReturnPeriod']].apply(lambda x: calc_correlation(pxHistory, x['momoPeriod'], x['fwdReturnPeriod']), axis=1)
-        # disconnect from db and return optimized variables
         optimization_db.disconnect()
-        return opt_vars
+        return opt_vars[['momoPeriod', 'fwdReturnPeriod', 'correl']].head(top)
+
+    # otherwise bring the saved running sums up to date 
+    saved = optimization_db.get_momo_stats(symbol)
+    if saved is not None and _momoStatsMatch(saved, pxHistory, momoPeriods, fwdReturnPeriods):
+        stats = saved[0]
+        numNewBars = len(close) - stats['numBars']
+        if numNewBars == 0:
+            print('[yellow]  ranking top %s momo periods from saved sums...[/yellow]'%(top))
+        else:
+            print('[yellow]  updating optimized variables with %s new bars...[/yellow]'%(numNewBars))
+            _updateMomoStats(stats, close)
     else: # calculate optimized variables since we don't have them saved
         print('[yellow]  no optimized variables found, calculating...[/yellow]')
-        opt_momo_periods = _calc_optimized_momo_periods(pxHistory, top, momoPeriodMax=momoPeriodMax, fwdReturnPeriodMax=fwdReturnPeriodMax)
-        optimization_db.save_opt_variables(pxHistory['symbol'][0], analysis_name, opt_momo_periods)
-        optimization_db.disconnect()
-        return opt_momo_periods
+        numNewBars = len(close)
+        stats = _momoStats(close, momoPeriods, fwdReturnPeriods)
+
+    opt_momo_periods = _topCorrelations(_momoStatsGrid(stats), top)
+    if numNewBars > 0:
+        optimization_db.save_momo_stats(symbol, stats, str(pxHistory['date'].iloc[-1]), commit=False)
+    optimization_db.save_opt_variables_batch(analysis_name, {symbol: opt_momo_periods}, {symbol: fingerprint})
+    optimization_db.disconnect()
+    return opt_momo_periods
+
+""" returns the fingerprint of the close and the periods optimized over, saved with the optimized variables """
+def _momoFingerprint(close, momoPeriods, fwdReturnPeriods):
+    digest = hashlib.blake2b(digest_size=8)
+    for values in (close, momoPeriods, fwdReturnPeriods):
+        digest.update(np.ascontiguousarray(values, dtype='float64').tobytes())
+    return '%s:%s'%(len(close), digest.hexdigest())
+
+""" True if saved momo stats cover the periods and a leading part of pxHistory, i.e. no bars were inserted before the last one folded in """
+def _momoStatsMatch(saved, pxHistory, momoPeriods, fwdReturnPeriods):
+    stats, lastDate = saved
+    if not (np.array_equal(stats['momoPeriods'], momoPeriods) and np.array_equal(stats['fwdReturnPeriods'], fwdReturnPeriods)):
+        return False
+    return 0 < stats['numBars'] <= len(pxHistory) and str(pxHistory['date'].iloc[stats['numBars'] - 1]) == lastDate
 
 """
     Implements a crossover function for momoperiod and its ema 
@@ -178,12 +178,8 @@ def plotMomoScatter(pxhistory, momPeriod1=10, momPeriod2=30, forwardReturnsPerio
 """
 def plotMomoQuintiles(pxHistory, momoPeriods=[], fwdReturnPeriods=[], **kwargs):
     numQuintileBins = kwargs.get('numQuintileBins', 15) # number of quintile bins to use
-    # get momo for each ? in momoPeriods
-    for period in momoPeriods:
-        # skip if momo already in pxHistory
-        if 'momo%s'%(period) not in pxHistory.columns:
-            pxHistory = momentum.calcMomoFactor(pxHistory, lag=period)
-            pxHistory.rename(columns={'momo': 'momo%s'%(period)}, inplace=True)
+    # get momo for each ? in momoPeriods, skipping momo already in pxHistory
+    pxHistory = momentum.addMomoFactors(pxHistory, momoPeriods)
 
     # get forward returns for each ? in fwdReturnPeriods
     for period in fwdReturnPeriods:
@@ -227,9 +223,7 @@ def plotMomoQuintiles(pxHistory, momoPeriods=[], fwdReturnPeriods=[], **kwargs):
 def plotMomoPairplot(pxhistory, momoPeriods=[3,5,8,13,21,34], forwardReturnsPeriods=[3,5,8,13,21,34]):
     
     # get momo for each ? in momoPeriods
-    for period in momoPeriods:
-        pxhistory = momentum.calcMomoFactor(pxhistory, lag=period)
-        pxhistory.rename(columns={'momo': 'momo%s'%(period), 'lagmomo': 'lagMomo%s'%(period)}, inplace=True)
+    pxhistory = momentum.addMomoFactors(pxhistory, momoPeriods)
 
     # get forward returns for each ? in forwardReturnsPeriods
     _n=1
@@ -362,10 +356,7 @@ def plotMomoDist(pxHistory, momPeriod=[3,6,12,24,48,96], percentiles = [.01, .05
     momPeriod.sort()
     
     # calc momo for each momPeriod
-    for period in momPeriod:
-        pxHistory = momentum.calcMomoFactor(pxHistory, lag=period)
-        pxHistory.rename(columns={'momo': 'momo%s'%(period)}, inplace=True)
-        pxHistory.rename(columns={'lagmomo': 'lagmomo%s'%(period)}, inplace=True)
+    pxHistory = momentum.addMomoFactors(pxHistory, momPeriod)
     
     # dynamically set the size of the plot 
     numRows = 2
@@ -572,12 +563,8 @@ def plotMomoAndFwdReturns(pxHistory, momoAndFwdReturnsPeriods):
     fig, ax = plt.subplots(2,5, figsize=(20, 10), sharex=True, sharey=True)
     # set figure title
     fig.suptitle('Momo vs Fwd Returns with Top r2')
-    # get momo for each unique momoperiod in momoAndFwdReturnsPeriods
-    for period in momoAndFwdReturnsPeriods['momoPeriod'].unique():
-        # skip if momo already in pxHistory
-        if 'momo%s'%(period) not in pxHistory.columns:
-            pxHistory = momentum.calcMomoFactor(pxHistory, lag=period)
-            pxHistory.rename(columns={'momo': 'momo%s'%(period)}, inplace=True)
+    # get momo for each unique momoperiod in momoAndFwdReturnsPeriods, skipping momo already in pxHistory
+    pxHistory = momentum.addMomoFactors(pxHistory, momoAndFwdReturnsPeriods['momoPeriod'].unique())
     
     # get forward returns for each unique fwdReturnPeriod in momoAndFwdReturnsPeriods
     for period in momoAndFwdReturnsPeriods['fwdReturnPeriod'].unique():
@@ -613,12 +600,8 @@ def plotMomoandPx_filteredByPercentile(pxHistory, momoAndFwdReturnsPeriods, momo
     # set figure title
     fig.suptitle('Momo vs Fwd Returns with Top r2 filtered by momoPercentile')
     
-    # get momo for each unique momoperiod in momoAndFwdReturnsPeriods
-    for period in momoAndFwdReturnsPeriods['momoPeriod'].unique():
-        # skip if momo already in pxHistory
-        if 'momo%s'%(period) not in pxHistory.columns:
-            pxHistory = momentum.calcMomoFactor(pxHistory, lag=period)
-            pxHistory.rename(columns={'momo': 'momo%s'%(period)}, inplace=True)
+    # get momo for each unique momoperiod in momoAndFwdReturnsPeriods, skipping momo already in pxHistory
+    pxHistory = momentum.addMomoFactors(pxHistory, momoAndFwdReturnsPeriods['momoPeriod'].unique())
     
     # get forward returns for each unique fwdReturnPeriod in momoAndFwdReturnsPeriods
     for period in momoAndFwdReturnsPeriods['fwdReturnPeriod'].unique():
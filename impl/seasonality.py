@@ -7,6 +7,7 @@ plots various seasonal analyses for a given symbol
 import sys
 sys.path.append('..')
 from utils import utils as ut
+from utils import utils_seasonality as sz
 
 import config
 
@@ -104,21 +105,33 @@ def plotSeasonalReturns_intraday(seasonalReturns, intervals, symbols, titles, ta
 ## this function plots a 3 x 3 grid of plots of log returns seasonality for select timeframes  
 def logReturns_overview_of_seasonality(symbol, restrictTradingHours=False, ytdlineplot=False):
     # get px history from db
-    with db.sqlite_connection(dbname_stock) as conn:
-        pxHistory_1day = db.getPriceHistory(conn, symbol, '1day', withpctChange=True)
-        pxHistory_5mins = db.getPriceHistory(conn, symbol, '30mins', withpctChange=True)
-
-    ###############################################
-    # restrict trading hours to 9:30am to 4pm
-    ###############################################
-    if restrictTradingHours:
-        pxHistory_5mins = pxHistory_5mins[(pxHistory_5mins['date'].dt.time >= dt.time(9, 30)) & (pxHistory_5mins['date'].dt.time <= dt.time(15, 55))]
-    ###############################################
-    ###############################################
+    with db.sqlite_connection(dbname_stock, readonly=True) as conn:
+        pxHistory_1day = db.getPriceHistory(conn, symbol, '1day', withpctChange=True, compact=True, withCalendar=True)
+        # full history intraday aggregates are read from the seasonality accumulators, only the bars for the heatmap are loaded 
+        pxHistory_5mins = db.getPriceHistory(conn, symbol, '30mins', withpctChange=True, compact=True, lookback=60, withCalendar=True)
+
+        ###############################################
+        # restrict trading hours to the session, config._sessionHours, the same hours as the inSession flag
+        ###############################################
+        session = config._sessionHours if restrictTradingHours else (None, None)
+        if restrictTradingHours:
+            pxHistory_5mins = pxHistory_5mins[pxHistory_5mins['inSession']]
+        ###############################################
+        ###############################################
+
+        currentYear = '%s-01-01'%(pxHistory_5mins['year'].max())
+        aggregate_timestamp_5mins = db.getSeasonality(conn, symbol, '30mins', by='timestamp', sessionStart=session[0], sessionEnd=session[1])
+        aggregate_logReturn_5mins_restricted = db.getSeasonality(conn, symbol, '30mins', by='timestamp', sessionStart=config._sessionHours[0], sessionEnd=config._sessionHours[1])
+        if ytdlineplot == True:
+            aggregate_timestamp_5mins_currentYear = db.aggregatePxHistory(conn, symbol, '30mins', by='timestamp', sessionStart=session[0], sessionEnd=session[1], start=currentYear)
+            aggregate_logReturn_5mins_restricted_currentYear = db.aggregatePxHistory(conn, symbol, '30mins', by='timestamp', sessionStart=config._sessionHours[0], sessionEnd=config._sessionHours[1], start=currentYear)
 
     # get log returns for pxhistory
     logReturn_1day = ut.calcLogReturns(pxHistory_1day, 'close')
     logReturn_5mins = ut.calcLogReturns(pxHistory_5mins, 'close')
+
+    # every daily bucketing, full history and current year, from one pass over the 1day returns
+    seasonality_1day = sz.Seasonality(logReturn_1day, 'logReturn', bucketNames=['month', 'dayOfMonth', 'dayOfWeek'], subsetNames=['all', 'currentYear'])
     
     # create figure, and axes
     fig, axes = plt.subplots(2, 3, figsize=(19, 9))
@@ -129,7 +142,7 @@ def logReturns_overview_of_seasonality(symbol, restrictTradingHours=False, ytdli
     ######
     ### monthly seasonality
     ######
-    seasonalAggregate_yearByMonth_logReturns_1day = ut.aggregate_by_month(logReturn_1day, 'logReturn')
+    seasonalAggregate_yearByMonth_logReturns_1day = seasonality_1day.get('month')
 
     # explicitly set axes
     ax1 = axes[0,0]
@@ -144,11 +157,10 @@ def logReturns_overview_of_seasonality(symbol, restrictTradingHours=False, ytdli
     # plot current year log returns 
     if ytdlineplot == True:
         # change title of the figure
-        fig.suptitle('Return Seasonality for %s vs %s return (%s years of data)'%(symbol.upper(), logReturn_1day['date'].dt.year.max(), round(len(pxHistory_1day)/252, 1)))
-        logReturn_1day_currentYear = logReturn_1day[logReturn_1day['date'].dt.year == logReturn_1day['date'].dt.year.max()].reset_index(drop=True) # select only the dates in the current year from logReturn_1day
+        fig.suptitle('Return Seasonality for %s vs %s return (%s years of data)'%(symbol.upper(), logReturn_1day['year'].max(), round(len(pxHistory_1day)/252, 1)))
         
         # aggregate
-        seasonalAggregate_logReturnsForCurrentyear = ut.aggregate_by_month(logReturn_1day_currentYear, 'logReturn')
+        seasonalAggregate_logReturnsForCurrentyear = seasonality_1day.get('month', 'currentYear')
         
         # plot the current year mean as a lineplot on the same axis as historical mean 
         sns.lineplot(x=seasonalAggregate_logReturnsForCurrentyear.index, y='mean', data=seasonalAggregate_logReturnsForCurrentyear, ax=ax2, color='green', alpha=1)
@@ -157,7 +169,7 @@ def logReturns_overview_of_seasonality(symbol, restrictTradingHours=False, ytdli
     ######
     ## day of month 
     ######
-    aggregate_day_of_month = ut.aggregate_by_dayOfMonth(logReturn_1day, 'logReturn')
+    aggregate_day_of_month = seasonality_1day.get('dayOfMonth')
     # set axes
     ax3 = axes[0,1]
     ax4 = ax3.twinx()
@@ -172,7 +184,7 @@ def logReturns_overview_of_seasonality(symbol, restrictTradingHours=False, ytdli
     # plot for current year if ytdlineplot == True
     if ytdlineplot == True:
         ## aggregate by day of month for current year
-        aggregate_day_of_month_currentYear = ut.aggregate_by_dayOfMonth(logReturn_1day_currentYear, 'logReturn')
+        aggregate_day_of_month_currentYear = seasonality_1day.get('dayOfMonth', 'currentYear')
         # plot the mean as a lineplot on ax3
         sns.lineplot(x=aggregate_day_of_month_currentYear.index, y='mean', data=aggregate_day_of_month_currentYear, ax=ax4, color='green', alpha=1)
 
@@ -180,7 +192,7 @@ def logReturns_overview_of_seasonality(symbol, restrictTradingHours=False, ytdli
     ######
     ## day of week
     ######
-    aggregate_day_of_week = ut.aggregate_by_dayOfWeek(logReturn_1day, 'logReturn')
+    aggregate_day_of_week = seasonality_1day.get('dayOfWeek')
     # set axes
     ax5 = axes[0,2]
     ax6 = ax5.twinx()
@@ -194,15 +206,13 @@ def logReturns_overview_of_seasonality(symbol, restrictTradingHours=False, ytdli
 
     if ytdlineplot == True:
         ## aggregate by day of week for current year
-        aggregate_day_of_week_currentYear = ut.aggregate_by_dayOfWeek(logReturn_1day_currentYear, 'logReturn')
+        aggregate_day_of_week_currentYear = seasonality_1day.get('dayOfWeek', 'currentYear')
         # plot the mean as a lineplot on ax3
         sns.lineplot(x=aggregate_day_of_week_currentYear.index, y='mean', data=aggregate_day_of_week_currentYear, ax=ax6, color='green', alpha=1)
 
     ######
     ## intra day
     ######
-    # get aggregate by timestamp for 5min interval
-    aggregate_timestamp_5mins = ut.aggregate_by_timestamp(logReturn_5mins, 'logReturn')
     # add cumsum  on mean column
     aggregate_timestamp_5mins['cumsum'] = aggregate_timestamp_5mins['mean'].cumsum()
 
@@ -222,17 +232,14 @@ def logReturns_overview_of_seasonality(symbol, restrictTradingHours=False, ytdli
     axes[1,0].set_xticklabels(aggregate_timestamp_5mins['timestamp'], rotation=90, fontsize=8)
 
     if ytdlineplot == True:
-        ## aggregate by timestamp for current year
-        aggregate_timestamp_5mins_currentYear = ut.aggregate_by_timestamp(logReturn_5mins[logReturn_5mins['date'].dt.year == logReturn_5mins['date'].dt.year.max()], 'logReturn')
         # plot the mean as a lineplot on ax3
         sns.lineplot(x=aggregate_timestamp_5mins_currentYear.index, y='mean', data=aggregate_timestamp_5mins_currentYear, ax=ax8, color='green', alpha=1)
 
     ######
     # intra day restricted hours
     ######
-    # aggregate restricted hours only 
-    logReturn_5mins_restricted = logReturn_5mins[(logReturn_5mins['date'].dt.time >= dt.time(9, 30)) & (logReturn_5mins['date'].dt.time <= dt.time(15, 55))]
-    aggregate_logReturn_5mins_restricted = ut.aggregate_by_timestamp(logReturn_5mins_restricted, 'logReturn')
+    # restricted hours bars of the last days for the heatmap 
+    logReturn_5mins_restricted = logReturn_5mins[logReturn_5mins['inSession']]
     # recalculate cumsum
     aggregate_logReturn_5mins_restricted['cumsum'] = aggregate_logReturn_5mins_restricted['mean'].cumsum()
     
@@ -252,8 +259,6 @@ def logReturns_overview_of_seasonality(symbol, restrictTradingHours=False, ytdli
     axes[1,1].set_xticklabels(aggregate_logReturn_5mins_restricted['timestamp'], rotation=90, fontsize=8)
 
     if ytdlineplot == True:
-        ## aggregate by timestamp for current year
-        aggregate_logReturn_5mins_restricted_currentYear = ut.aggregate_by_timestamp(logReturn_5mins_restricted[logReturn_5mins_restricted['date'].dt.year == logReturn_5mins_restricted['date'].dt.year.max()], 'logReturn')
         # plot the mean as a lineplot on ax3
         sns.lineplot(x=aggregate_logReturn_5mins_restricted_currentYear.index, y='mean', data=aggregate_logReturn_5mins_restricted_currentYear, ax=ax10, color='green', alpha=1)
 
@@ -29,7 +29,7 @@ symbol = args.symbol.upper()
 
 tableName = db._constructTableName(symbol, '1day')
 
-with db.sqlite_connection(dbname_stocks) as conn:
+with db.sqlite_connection(dbname_stocks, readonly=True) as conn:
     symbolRecord = db.getPriceHistoryWithTablename(conn, tableName)
 
 
@@ -1,16 +1,37 @@
+import io
+import json
 import sqlite3
 import config
 import datetime
+import numpy as np
 import pandas as pd
 import sys
 
 from rich import print 
 
+""" Global vars """
+schemaVersion = 2 # PRAGMA user_version of an up to date db, 1 = results stored as lists in one row per symbol
+resultsTable = 'analysisResults'
+
+# parameter columns and the value column of the results of each analysis
+analysisColumns = {
+    'opt_momo_fwdReturn': (['momoPeriod', 'fwdReturnPeriod'], 'correl'),
+}
+
+# (momoPeriods x fwdReturnPeriods) running sums of the momo optimization, see save_momo_stats()
+momoStatsMatrices = {'n': 'int32', 'sumX': 'float32', 'sumY': 'float32', 'sumXX': 'float32', 'sumYY': 'float32', 'sumXY': 'float32'}
+
+""" returns a momo stat in the dtype it is stored in """
+def _storedMomoStat(key, value):
+    if key in momoStatsMatrices:
+        return np.asarray(value).astype(momoStatsMatrices[key])
+    return value
 
 class AnalysisOptimizationsDB:
     def __init__(self, db_path):
         self.db_path = db_path
         self.conn = sqlite3.connect(self.db_path)
+        self._ensure_schema()
 
     def connect(self): ## redundant function as we connect on init 
         self.conn = sqlite3.connect(self.db_path)
@@ -20,13 +41,50 @@ class AnalysisOptimizationsDB:
             self.conn.close()
             self.conn = None
 
+    """
+        creates the tables and indexes of the current schema, and migrates results saved with older schemas.
+        Results are stored one row per (symbol, analysis_name, params), params being the json of the parameter columns.
+    """
+    def _ensure_schema(self):
+        version = self.conn.execute('PRAGMA user_version').fetchone()[0]
+        if version >= schemaVersion:
+            return
+
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS %s (symbol TEXT NOT NULL, analysis_name TEXT NOT NULL, params TEXT NOT NULL, rank INTEGER, value REAL, fingerprint TEXT, date_added TEXT, PRIMARY KEY (symbol, analysis_name, params))" % (resultsTable))
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_%s_symbol_analysis ON %s (symbol, analysis_name, rank)" % (resultsTable, resultsTable))
+            self.conn.execute("CREATE TABLE IF NOT EXISTS updateHistory (symbol TEXT, analysis_name TEXT, last_update_date TEXT)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_updateHistory_symbol_analysis ON updateHistory (symbol, analysis_name)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS opt_momo_fwdReturn_stats (symbol TEXT PRIMARY KEY, numBars INTEGER, lastDate TEXT, stats BLOB, date_added TEXT)")
+            self._migrate_list_results()
+            self.conn.execute('PRAGMA user_version = %s' % (schemaVersion))
+        print(' %s:[green] Analysis optimizations db at schema version %s[/green]' % (datetime.datetime.now(), schemaVersion))
+
+    """
+        copies results saved by schema version 1 (one row per symbol, parameters and values as lists in strings)
+        into the results table. The old table is left in place. Rows that cannot be parsed are skipped.
+    """
+    def _migrate_list_results(self):
+        for analysis_name, (paramColumns, valueColumn) in analysisColumns.items():
+            if self.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (analysis_name,)).fetchone() is None:
+                continue
+            legacy = pd.read_sql_query("SELECT * FROM %s" % (analysis_name), self.conn)
+            for _, row in legacy.iterrows():
+                try:
+                    columns = {column: json.loads(row[column].replace('nan', 'NaN')) for column in paramColumns + [valueColumn]}
+                except (ValueError, AttributeError):
+                    continue
+                variables = pd.DataFrame(columns)
+                self._save_results(row['symbol'], analysis_name, variables, fingerprint=None, dateAdded=row['date_added'])
+
     """
         updates meta data of saved analyses. 
         inputs: 
             symbol
             analysis_name
+            commit: commit the change, False when the caller commits a batch of changes
     """
-    def _update_analysis_metadata(self, symbol, analysis_name):
+    def _update_analysis_metadata(self, symbol, analysis_name, commit=True):
         tablename = 'updateHistory'
         currentdate = datetime.datetime.now()
         
@@ -41,62 +99,136 @@ class AnalysisOptimizationsDB:
             sqlStatement = "UPDATE %s SET last_update_date = '%s' WHERE symbol = '%s' AND analysis_name = '%s'" % (
                 tablename, currentdate, symbol, analysis_name)
             self.conn.execute(sqlStatement)
-            self.conn.commit()
+            if commit:
+                self.conn.commit()
             print(' %s:[green] Updated %s %s[/green]' % (datetime.datetime.now(),symbol, analysis_name))
         else:
             sqlStatement = "INSERT INTO %s (symbol, analysis_name, last_update_date) VALUES ('%s', '%s', '%s')" % (
             tablename, symbol, analysis_name, currentdate)
             self.conn.execute(sqlStatement)
-            self.conn.commit()
+            if commit:
+                self.conn.commit()
             print(' %s:[green] Added %s %s[/green]' % (datetime.datetime.now(), symbol, analysis_name))
     
     """
-        Private function, saves optimized variables for momo vs. fwd returns correlation 
+        Private function, replaces the saved results of a symbol and analysis, one row per set of parameters,
+        ranked in the order of the passed in variables. Does not commit.
         inputs:
             symbol str
-            momoPeriod [] 
-            fwdReturnPeriod []
-    """
-    def _save_opt_momo_fwdReturns(self, symbol, momoPeriod, fwdReturnPeriod, correl):
-        tablename = 'opt_momo_fwdReturn'
-        # set correl to 9 sig figs
-        correl = [round(x, 9) for x in correl]
-        sqlStatement = "INSERT INTO %s (symbol, momoPeriod, fwdReturnPeriod, correl, date_added) VALUES ('%s', '%s', '%s', '%s', '%s')" % (
-            tablename, symbol, momoPeriod, fwdReturnPeriod, correl, datetime.datetime.now())
-        self.conn.execute(sqlStatement)
-        self.conn.commit()
+            analysis_name str
+            variables df with the parameter and value columns of the analysis, see analysisColumns
+            fingerprint str of the data the results were computed on
+    """
+    def _save_results(self, symbol, analysis_name, variables, fingerprint=None, dateAdded=None):
+        paramColumns, valueColumn = analysisColumns[analysis_name]
+        dateAdded = dateAdded or str(datetime.datetime.now())
+        records = []
+        for rank, row in enumerate(variables[paramColumns + [valueColumn]].itertuples(index=False)):
+            params = json.dumps({column: int(value) for column, value in zip(paramColumns, row[:-1])}, sort_keys=True)
+            # set value to 9 sig figs
+            value = None if pd.isna(row[-1]) else round(float(row[-1]), 9)
+            records.append((symbol, analysis_name, params, rank, value, fingerprint, dateAdded))
         
+        self.conn.execute("DELETE FROM %s WHERE symbol = ? AND analysis_name = ?" % (resultsTable), (symbol, analysis_name))
+        self.conn.executemany("INSERT OR REPLACE INTO %s (symbol, analysis_name, params, rank, value, fingerprint, date_added) VALUES (?, ?, ?, ?, ?, ?, ?)" % (resultsTable), records)
     
     ############################################################
     ##################### PUBLIC FUNCTIONS #####################
     ############################################################
     """ 
-        Saves optimized analysis variables to db, handles all analysis types    
+        Saves optimized analysis variables to db, handles all analysis types, replacing variables already saved for the symbol
         Inputs: 
             [str] symbol
             [str] analysis_name 
             [df] variables 
+            [str] fingerprint: optional, fingerprint of the data the variables were computed on
     """
-    def save_opt_variables(self, symbol, analysis_name, variables):
-        if analysis_name == 'opt_momo_fwdReturn':
-            self._save_opt_momo_fwdReturns(symbol, variables['momoPeriod'].tolist(), variables['fwdReturnPeriod'].tolist(), variables['correl'].tolist())
-            self._update_analysis_metadata(symbol, analysis_name)
+    def save_opt_variables(self, symbol, analysis_name, variables, fingerprint=None):
+        self.save_opt_variables_batch(analysis_name, {symbol: variables}, {symbol: fingerprint})
+
+    """ 
+        Saves optimized analysis variables of many symbols in a single transaction, replacing 
+        variables already saved for the symbols
+        Inputs: 
+            [str] analysis_name 
+            [dict] variables: {symbol: df of variables}
+            [dict] fingerprints: optional, {symbol: fingerprint of the data the variables were computed on}
+    """
+    def save_opt_variables_batch(self, analysis_name, variables, fingerprints=None):
+        if analysis_name not in analysisColumns:
+            return
+        fingerprints = fingerprints or {}
+        try:
+            for symbol, symbolVariables in variables.items():
+                self._save_results(symbol, analysis_name, symbolVariables, fingerprints.get(symbol))
+                self._update_analysis_metadata(symbol, analysis_name, commit=False)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
 
     """
-        Retrieves analysis variables 
+        Returns the symbols that have saved variables for the analysis
+        Inputs: 
+            analysis_name
+    """
+    def get_analysis_symbols(self, analysis_name):
+        sqlStatement = "SELECT DISTINCT symbol FROM %s WHERE analysis_name = ?" % (resultsTable)
+        return [row[0] for row in self.conn.execute(sqlStatement, (analysis_name,)).fetchall()]
+
+    """ 
+        Saves the running sums the momo vs. fwd return optimization is updated from, replacing the saved ones. 
+        Counts are stored as int32 and the sums as float32 (~1e-8 on the correlations), compressed: 
+        about 2.2 MB per symbol for the default 361 x 361 periods, against 6.3 MB for the raw float64 arrays 
+        Inputs: 
+            [str] symbol
+            [dict] stats: arrays and counts, see momentum._momoStats()
+            [str] lastDate: date of the last bar folded into the stats 
+            commit: commit the change, False when the caller commits a batch of changes
+    """
+    def save_momo_stats(self, symbol, stats, lastDate, commit=True):
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **{key: _storedMomoStat(key, value) for key, value in stats.items()})
+        self.conn.execute("INSERT OR REPLACE INTO opt_momo_fwdReturn_stats (symbol, numBars, lastDate, stats, date_added) VALUES (?, ?, ?, ?, ?)", 
+                          (symbol, int(stats['numBars']), lastDate, buffer.getvalue(), str(datetime.datetime.now())))
+        if commit:
+            self.conn.commit()
+
+    """
+        Retrieves the running sums of the momo vs. fwd return optimization 
+        Inputs: 
+            symbol
+        Returns (stats, lastDate), None if none found
+    """
+    def get_momo_stats(self, symbol):
+        record = self.conn.execute("SELECT stats, lastDate FROM opt_momo_fwdReturn_stats WHERE symbol = ?", (symbol,)).fetchone()
+        if record is None:
+            return None
+        with np.load(io.BytesIO(record[0])) as arrays:
+            # sums are updated in float64 
+            stats = {key: arrays[key].astype('float64') if key in momoStatsMatrices else arrays[key] for key in arrays.files}
+        stats['numBars'] = int(stats['numBars'])
+        return stats, record[1]
+
+    """
+        Retrieves analysis variables, best ranked first
         Inputs: 
             symbol
             analysis_name
-        Returns false if none found 
+        Returns a df with the parameter and value columns of the analysis plus rank, fingerprint and date_added, None if none found
     """
     def get_analysis_variables(self, symbol, analysis_name):
-        tablename = analysis_name
-        sqlStatement = "SELECT * FROM %s WHERE symbol = '%s'" % (
-            tablename, symbol)
+        if analysis_name not in analysisColumns:
+            return None
+        paramColumns, valueColumn = analysisColumns[analysis_name]
+        sqlStatement = "SELECT params, value, rank, fingerprint, date_added FROM %s WHERE symbol = ? AND analysis_name = ? ORDER BY rank" % (resultsTable)
         
-        data2 = pd.read_sql_query(sqlStatement, self.conn)
+        data2 = pd.read_sql_query(sqlStatement, self.conn, params=(symbol, analysis_name))
         
         if not data2.empty:
+            params = pd.DataFrame([json.loads(params) for params in data2.pop('params')], columns=paramColumns)
+            data2 = pd.concat([params, data2.rename(columns={'value': valueColumn})], axis=1)
+            data2.insert(0, 'symbol', symbol)
             return data2
         else:
             return None
@@ -104,14 +236,13 @@ class AnalysisOptimizationsDB:
 
 # Usage example:
 #db = AnalysisOptimizationsDB(config.dbname_analysisOptimizations)
-#db.connect()
 
 # add mock data 
-#df = pd.DataFrame({'momoPeriod': [12,13,42], 'fwdReturnPeriod': [10,12,32]})
+#df = pd.DataFrame({'momoPeriod': [12,13,42], 'fwdReturnPeriod': [10,12,32], 'correl': [0.1, 0.09, 0.08]})
 #db.save_opt_variables('SPY', 'opt_momo_fwdReturn', df)
 
 # retrieve mock data 
-#savedOpt = db.get_analysis_variables('GBT', 'opt_momo_fwdReturn')
+#savedOpt = db.get_analysis_variables('SPY', 'opt_momo_fwdReturn')
 #print(savedOpt)
  
 #db.disconnect()
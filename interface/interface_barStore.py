@@ -0,0 +1,184 @@
+"""
+This module implements a compact binary OHLCV store of the px history tables in the local db.
+
+    - partitioned by symbol/interval/year, one .npy file per column and partition
+    - int64 epoch (seconds), float32 open/high/low/close, int64 volume
+    - partitions are memory-mapped read-only, a date range within one year is a zero-copy slice
+    - export() keeps the store in sync with the sqlite table, only years with new rows are rewritten
+
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+import config
+
+from interface import interface_pxCache as pxCache
+
+""" Global vars """
+storeDir = config.dbname_barStore
+
+columnDtypes = {'epoch': 'int64', 'open': 'float32', 'high': 'float32', 'low': 'float32', 'close': 'float32', 'volume': 'int64'}
+
+def _seriesDir(symbol, interval):
+    return os.path.join(storeDir, symbol, interval)
+
+def _readMeta(symbol, interval):
+    try:
+        with open(os.path.join(_seriesDir(symbol, interval), 'meta.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+""" returns the year of each epoch """
+def _years(epoch):
+    return epoch.astype('datetime64[s]').astype('datetime64[Y]').astype('int64') + 1970
+
+""" returns the epoch of jan 1st of the year """
+def _yearStart(year):
+    return int(np.datetime64(str(year), 's').astype('int64'))
+
+""" 
+returns the sql expression of the epoch of the records of a table: the stored epoch, or for records saved without 
+one (tables not migrated yet) the date parsed the same way as interface_localDB._parseDbDates() 
+"""
+def _epochSql(tableColumns, interval):
+    numChars = 10 if interval == '1day' else 19
+    parsed = 'CAST(strftime(\'%%s\', substr(date, 1, %s)) AS INTEGER)'%(numChars)
+    if 'epoch' in tableColumns:
+        return 'COALESCE(epoch, %s)'%(parsed)
+    return parsed
+
+"""
+Writes the bars of a table to the store, rewriting only the years that have rows added since the last export. 
+Tables without an epoch column (not migrated yet, see interface_localDB._migratePxTable()) are exported with 
+epochs computed from their dates. 
+
+Params
+===========
+conn - [sqlite3 connection]
+tablename - [str] sqlite table to export 
+symbol, interval - [str] partition of the store to write to 
+dbPath - [str] file path of the db, identifies the source of the export. Pass it for connections to 
+    in-memory copies of the db, see interface_localDB._dbPath(), defaults to the file of the connection 
+
+Returns
+===========
+True if the store was updated, False if it was already in sync 
+
+"""
+def export(conn, tablename, symbol, interval, dbPath=None):
+    if dbPath is None:
+        dbPath = conn.execute('PRAGMA database_list').fetchone()[2]
+    version = pxCache.getDataVersion(conn, tablename)
+    tableColumns = [column[1] for column in conn.execute('PRAGMA table_info("%s")'%(tablename)).fetchall()]
+    epoch = _epochSql(tableColumns, interval)
+    meta = _readMeta(symbol, interval)
+    sameSource = meta is not None and meta['dbPath'] == dbPath and meta['tablename'] == tablename
+
+    if sameSource and meta['version'] == version:
+        return False
+
+    # rows are only ever appended, so the years to rewrite are the ones holding rows with a higher rowid 
+    fromEpoch = None
+    if sameSource and version[0] is not None and meta['version'][0] is not None and version[0] > meta['version'][0]:
+        minEpoch = conn.execute('SELECT MIN(%s) FROM "%s" WHERE ROWID > ?'%(epoch, tablename), [meta['version'][0]]).fetchone()[0]
+        if minEpoch is not None:
+            fromEpoch = _yearStart(_years(np.array([minEpoch]))[0])
+
+    seriesDir = _seriesDir(symbol, interval)
+    if fromEpoch is None:
+        shutil.rmtree(seriesDir, ignore_errors=True)
+        years = []
+    else:
+        years = [year for year in meta['years'] if _yearStart(year) < fromEpoch]
+    os.makedirs(seriesDir, exist_ok=True)
+
+    # missing price columns (e.g. no volume on index tables) are exported as 0 
+    selectColumns = ['%s AS epoch'%(epoch)] + [column if column in tableColumns else '0 AS %s'%(column) for column in columnDtypes if column != 'epoch']
+    sqlStatement = 'SELECT %s FROM "%s" WHERE %s IS NOT NULL'%(', '.join(selectColumns), tablename, epoch)
+    params = []
+    if fromEpoch is not None:
+        sqlStatement += ' AND %s >= ?'%(epoch)
+        params.append(fromEpoch)
+    bars = pd.read_sql(sqlStatement + ' ORDER BY epoch', conn, params=params)
+
+    barYears = _years(bars['epoch'].to_numpy(dtype='int64'))
+    for year in np.unique(barYears):
+        inYear = barYears == year
+        yearDir = os.path.join(seriesDir, str(year))
+        tmpDir = yearDir + '.tmp'
+        shutil.rmtree(tmpDir, ignore_errors=True)
+        os.makedirs(tmpDir)
+        for column, dtype in columnDtypes.items():
+            values = bars[column].to_numpy()[inYear]
+            if dtype == 'int64':
+                values = np.nan_to_num(values.astype('float64')).round()
+            np.save(os.path.join(tmpDir, column + '.npy'), values.astype(dtype))
+        shutil.rmtree(yearDir, ignore_errors=True)
+        os.replace(tmpDir, yearDir)
+        years.append(int(year))
+
+    # meta is written last, an interrupted export is redone in full on the next one 
+    with open(os.path.join(seriesDir, 'meta.json'), 'w') as f:
+        json.dump({'dbPath': dbPath, 'tablename': tablename, 'version': version, 'years': sorted(set(years))}, f)
+
+    return True
+
+"""
+Returns the bars of a symbol as a dict of column arrays, or None if the series was never exported. 
+Ranges within one year are read-only views of the memory-mapped partition, ranges over several years are copied. 
+
+Params
+===========
+symbol, interval - [str]
+start - [str|datetime] optional, first date to return 
+end - [str|datetime] optional, dates before end are returned 
+
+"""
+def read(symbol, interval, start=None, end=None):
+    meta = _readMeta(symbol, interval)
+    if meta is None:
+        return None
+
+    startEpoch = None if start is None else int(pd.Timestamp(start).timestamp())
+    endEpoch = None if end is None else int(pd.Timestamp(end).timestamp())
+
+    partitions = []
+    for year in meta['years']:
+        if endEpoch is not None and _yearStart(year) >= endEpoch:
+            continue
+        if startEpoch is not None and _yearStart(year + 1) <= startEpoch:
+            continue
+
+        yearDir = os.path.join(_seriesDir(symbol, interval), str(year))
+        partition = {column: np.load(os.path.join(yearDir, column + '.npy'), mmap_mode='r') for column in columnDtypes}
+        first = 0 if startEpoch is None else np.searchsorted(partition['epoch'], startEpoch, side='left')
+        last = len(partition['epoch']) if endEpoch is None else np.searchsorted(partition['epoch'], endEpoch, side='left')
+        partitions.append({column: values[first:last] for column, values in partition.items()})
+
+    if not partitions:
+        return {column: np.empty(0, dtype=dtype) for column, dtype in columnDtypes.items()}
+    if len(partitions) == 1:
+        return partitions[0]
+    return {column: np.concatenate([partition[column] for partition in partitions]) for column in columnDtypes}
+
+"""
+Returns bars as a px history dataframe (date, open, high, low, close, volume) 
+"""
+def toFrame(bars):
+    pxHistory = pd.DataFrame({column: values for column, values in bars.items() if column != 'epoch'}, copy=False)
+    pxHistory.insert(0, 'date', bars['epoch'].astype('datetime64[s]').astype('datetime64[ns]'))
+    return pxHistory
+
+"""
+Deletes the store of the passed in series, or the whole store if none is passed in 
+"""
+def clear(symbol=None, interval=None):
+    if symbol is None:
+        shutil.rmtree(storeDir, ignore_errors=True)
+    else:
+        shutil.rmtree(_seriesDir(symbol, interval), ignore_errors=True)
@@ -1,37 +1,165 @@
 """
 This module simplifies interacting with the local database of historical ohlc data. 
 
-    - connect to db
+    - connect to db, readers share pooled read-only connections and never write to the db 
+    - tables are brought up to the current layout (date index, epoch column) on the writer side, 
+      by saveHistoryToDB() and _migrateDb(), readers parse dates of tables that were not migrated yet 
     - save historical data to local db 
     - retrieve historical data for symbol and interval 
     - automatically clears duplicates if any
+    - serves px history from the columnar cache (interface_pxCache) when it is up to date
+    - keeps running seasonality statistics of every table up to date as records are saved, see getSeasonality()
 
 """
 
+import hashlib
+import math
+import os
 import sqlite3
 import sys
+import threading
+import time
 import config
 
+from contextlib import contextmanager
+
+import numpy as np
 import pandas as pd
 sys.path.append('..')
 from utils import utils as ut
+from utils import utils_calendar as cal
+from utils import utils_returns as rt
+from utils import utils_seasonality as sz
+from interface import interface_barStore as barStore
+from interface import interface_pxCache as pxCache
 
 """ Global vars """
 dbname_index = config.dbname_stock
 
 index_list = config._indexList # global reference list of index symbols, this is some janky ass shit .... 
 
-""" implements contextmanager for db connection """
+# intervals getPriceHistory() can resample to, and their pandas offsets 
+_intervalOffsets = {'1min': '1min', '5mins': '5min', '15mins': '15min', '30mins': '30min', '1hour': '1h', '4hours': '4h', '1day': '1D'}
+_barAggregations = {'date': 'first', 'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum', 'barCount': 'sum'}
+_seasonalityTable = '00-seasonality_accumulators' # count, mean, M2 of logReturn per table, bucket and bucket key
+_seasonalityWatermarkTable = '00-seasonality_watermarks' # last record folded into the accumulators of each table
+
+""" connection to an in-memory copy of a db file, remembers the file it was copied from """
+class sqlite_memoryConnection(sqlite3.Connection):
+    sourcePath = ''
+
+"""
+Pool of long-lived connections per db path
+    - readers: one read-only connection per thread and db, with mmap and a large page cache 
+      so repeated queries hit warm pages 
+    - writer: one connection per db, serialized with a lock, switches the db to WAL journaling 
+Readers never write to the db, it stays in the journal mode its writers set. 
+
+With config.sqlite_inMemory set, readers are served from an in-memory copy of the db instead, see loadInMemory() 
+"""
+class sqlite_connectionPool(object):
+
+    def __init__(self):
+        self._local = threading.local()
+        self._writers = {}
+        self._writerLocks = {}
+        self._memoryDbs = {}
+        self._lock = threading.Lock()
+        self._memoryLock = threading.Lock()
+
+    """ returns the read-only connection of the calling thread for the db """
+    def reader(self, db_name):
+        if not hasattr(self._local, 'readers'):
+            self._local.readers = {}
+        db_name = os.path.abspath(db_name)
+
+        if db_name not in self._local.readers and config.sqlite_inMemory:
+            uri = self.loadInMemory(db_name)
+            conn = sqlite3.connect(uri, uri=True, factory=sqlite_memoryConnection)
+            conn.sourcePath = db_name
+            conn.execute('PRAGMA query_only = ON')
+            self._local.readers[db_name] = conn
+
+        if db_name not in self._local.readers:
+            conn = sqlite3.connect(db_name)
+            conn.execute('PRAGMA query_only = ON')
+            conn.execute('PRAGMA mmap_size = %s'%(config.sqlite_mmapSize))
+            conn.execute('PRAGMA cache_size = -%s'%(config.sqlite_cacheSizeKb))
+            self._local.readers[db_name] = conn
+
+        return self._local.readers[db_name]
+
+    """
+        copies the db into a shared in-memory db with the sqlite backup api, once per process, and returns its uri. 
+        The db file is never written to: px tables are migrated in the copy, after the backup, so batch 
+        runs read stored epochs even from tables the writer side has not migrated yet, see _migrateTables(). 
+        Reads from the copy do not see writes made to the db file after it was loaded. 
+    """
+    def loadInMemory(self, db_name):
+        db_name = os.path.abspath(db_name)
+        with self._memoryLock:
+            if db_name in self._memoryDbs:
+                return self._memoryDbs[db_name][0]
+
+            starttimer = time.perf_counter()
+            uri = 'file:memdb_%s?mode=memory&cache=shared'%(hashlib.md5(db_name.encode()).hexdigest()[:8])
+            # the in-memory db lives as long as one connection to it is open, this one is never closed 
+            keepAlive = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            source = sqlite3.connect(db_name)
+            try:
+                source.backup(keepAlive)
+            finally:
+                source.close()
+            _migrateTables(keepAlive)
+            self._memoryDbs[db_name] = (uri, keepAlive)
+
+            print('  loaded %s into memory in %.2fs'%(os.path.basename(db_name), time.perf_counter() - starttimer))
+            return uri
+
+    """ contextmanager, yields the serialized writer connection for the db and commits on exit """
+    @contextmanager
+    def writer(self, db_name):
+        db_name = os.path.abspath(db_name)
+        with self._lock:
+            lock = self._writerLocks.setdefault(db_name, threading.RLock())
+
+        with lock:
+            if db_name not in self._writers:
+                conn = sqlite3.connect(db_name, check_same_thread=False, timeout=30)
+                conn.execute('PRAGMA journal_mode = WAL')
+                conn.execute('PRAGMA synchronous = NORMAL')
+                self._writers[db_name] = conn
+            conn = self._writers[db_name]
+            try:
+                yield conn
+                conn.commit()
+            except:
+                conn.rollback()
+                raise
+
+connectionPool = sqlite_connectionPool()
+
+""" 
+implements contextmanager for db connection 
+
+readonly connections are borrowed from the connection pool and stay open on exit
+"""
 class sqlite_connection(object): 
     
-    def __init__(self, db_name):
+    def __init__(self, db_name, readonly=False):
         self.db_name = db_name
+        self.readonly = readonly
     
     def __enter__(self):
-        self.conn = sqlite3.connect(self.db_name)
+        if self.readonly:
+            self.conn = connectionPool.reader(self.db_name)
+        else:
+            self.conn = sqlite3.connect(self.db_name)
         return self.conn
     
     def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.readonly:
+            return
         self.conn.commit()
         self.conn.close()
 
@@ -45,6 +173,12 @@ def _connectToDb_deprecate(dbname = dbname_index):
     # set dbname to \\workbench\\historicalData\\venv\\saveHistoricalData\\ + dbname
     return sqlite3.connect(dbname)
 
+""" returns the file path of the db behind the connection (the source file for in-memory copies), '' for in-memory dbs """
+def _dbPath(conn):
+    if isinstance(conn, sqlite_memoryConnection):
+        return conn.sourcePath
+    return conn.execute('PRAGMA database_list').fetchone()[2]
+
 """
 constructs the appropriate tablename to call local DB 
 
@@ -65,23 +199,40 @@ def _constructTableName(symbol, interval):
 
 """
 utility - permanently remove duplicate records from ohlc table
+Only needed once per table, before the unique date index is added 
 
 Params
 ==========
 tablename - [str]
 """
-def _removeDuplicates(tablename):
-    conn = _connectToDb() # connect to DB
-
+def _removeDuplicates(conn, tablename):
     ## construct SQL qeury that will group on 'date' column and
     ## select the min row ID of each group; then delete all the ROWIDs from 
     ## the table that not in this list
-    sql_selectMinId = 'DELETE FROM %s WHERE ROWID NOT IN (SELECT MIN(ROWID) FROM %s GROUP BY date)'%(tablename, tablename)
+    sql_selectMinId = 'DELETE FROM "%s" WHERE ROWID NOT IN (SELECT MIN(ROWID) FROM "%s" GROUP BY date)'%(tablename, tablename)
 
     ## run the query 
     cursor = conn.cursor()
     cursor.execute(sql_selectMinId)
 
+"""
+utility - one time migration that enforces unique dates on an ohlc table: clears existing 
+duplicates, then adds a unique index on date so later writes can skip duplicates on insert
+
+Params
+==========
+tablename - [str]
+"""
+def _ensureUniqueDateIndex(conn, tablename):
+    indexName = 'idx_%s_dateUnique'%(tablename)
+    cursor = conn.execute('SELECT name FROM sqlite_master WHERE type = \'index\' AND name = ?', (indexName,))
+    if cursor.fetchone() is not None:
+        return
+
+    with conn:
+        _removeDuplicates(conn, tablename)
+        conn.execute('CREATE UNIQUE INDEX "%s" ON "%s" (date)'%(indexName, tablename))
+
 """
 sub to update the symbol record lookup table
 This should be called when local db records are updated 
@@ -131,33 +282,77 @@ def _updateLookup_symbolRecords(conn, tablename, earliestTimestamp, numMissingDa
         cursor = conn.cursor()
         cursor.execute(sql_update)
 
+"""
+parses date strings as stored in the db in a single vectorized pass. Handles 'YYYY-MM-DD', 
+'YYYY-MM-DD HH:MM:SS' and dates with errant timezone info, which is dropped.
+1day dates are truncated to the date.
+"""
+def _parseDbDates(dates, interval):
+    numChars = 10 if interval == '1day' else 19
+    return pd.to_datetime(dates.str.slice(0, numChars), format='ISO8601')
+
+""" returns int64 epoch seconds for parsed dates, this is what is stored in the epoch column """
+def _toEpoch(dates):
+    return dates.to_numpy(dtype='datetime64[s]').astype('int64')
+
+"""
+utility - backfills the normalized int64 epoch column of a px history table, adding the 
+column first if the table does not have one. Only rows with a missing epoch are parsed, 
+found through a partial index, so this is cheap once a table has been migrated. 
+
+Params
+==========
+tablename - [str]
+"""
+def _backfillEpoch(conn, tablename):
+    columns = [row[1] for row in conn.execute('PRAGMA table_info("%s")'%(tablename))]
+    if 'epoch' not in columns:
+        conn.execute('ALTER TABLE "%s" ADD COLUMN epoch INTEGER'%(tablename))
+    conn.execute('CREATE INDEX IF NOT EXISTS "idx_%s_epochMissing" ON "%s" (epoch) WHERE epoch IS NULL'%(tablename, tablename))
+
+    missing = pd.read_sql('SELECT ROWID AS rid, date FROM "%s" WHERE epoch IS NULL'%(tablename), conn)
+    if not missing.empty:
+        # tables are named <symbol>_..._<interval>, not every table has an interval column 
+        epoch = _toEpoch(_parseDbDates(missing['date'], tablename.rsplit('_', 1)[-1]))
+        conn.executemany('UPDATE "%s" SET epoch = ? WHERE ROWID = ?'%(tablename), zip(epoch.tolist(), missing['rid'].tolist()))
+    conn.commit()
+
+"""
+returns the sql expression of a calendar key of the records of a table: month (1-12), dayOfWeek (0 on mondays 
+like pandas) or minuteOfDay. Computed from epoch, or from the date string on tables that have no epoch column yet.
+"""
+def _calendarKeySql(conn, tablename, key):
+    columns = [row[1] for row in conn.execute('PRAGMA table_info("%s")'%(tablename))]
+    timestamp = 'epoch, \'unixepoch\'' if 'epoch' in columns else 'substr(date, 1, 19)'
+    if key == 'month':
+        return 'CAST(strftime(\'%%m\', %s) AS INTEGER)'%(timestamp)
+    if key == 'dayOfWeek':
+        # %w is 0 on sundays 
+        return '(CAST(strftime(\'%%w\', %s) AS INTEGER) + 6) %% 7'%(timestamp)
+    return '(CAST(strftime(\'%%H\', %s) AS INTEGER) * 60 + CAST(strftime(\'%%M\', %s) AS INTEGER))'%(timestamp, timestamp)
+
 """ ensures proper format of px history tables retrieved from db """
 def _formatpxHistory(pxHistory):
     pxHistory.reset_index(drop=True, inplace=True) # reset index
+    if pxHistory.empty:
+        return pxHistory
 
-    # if interval is 1day, make sure sure the date column only has 10chars 
-    if pxHistory['interval'][1] == '1day':
-        pxHistory['date'] = pxHistory['date'].str[:10]
-    
-    ##### Remove any errant timezone info:
-    # get the rows that have timezone info in the date column
-    # remove the timezone info from the date column
-    # update pxhistory with the formatted date column
-    pxHistory_hasTimezone = pxHistory[pxHistory['date'].str.len() > 19].copy()
-    if not pxHistory_hasTimezone.empty:
-        # remove the timezone info from the date column, while not triggering a settingwithcopy warning
-        pxHistory_hasTimezone.loc[:, 'date'] = pxHistory_hasTimezone['date'].str[:19]
-
-        # update pxhistory with the formatted date column
-        pxHistory.update(pxHistory_hasTimezone)
-
-    # final formatting ... 
-    if pxHistory['interval'][1] == '1day':
-        pxHistory['date'] = pd.to_datetime(pxHistory['date'], format='%Y-%m-%d')
+    # use the stored epoch where we have it, only parse date strings that are missing one
+    if 'epoch' in pxHistory.columns:
+        epoch = pxHistory.pop('epoch')
+        hasEpoch = epoch.notna()
+        dates = pd.Series(pd.to_datetime(epoch[hasEpoch].astype('int64'), unit='s'), index=pxHistory.index)
+        if not hasEpoch.all():
+            dates[~hasEpoch] = _parseDbDates(pxHistory.loc[~hasEpoch, 'date'], pxHistory['interval'].iloc[0])
+        pxHistory['date'] = dates
     else:
-        pxHistory['date'] = pd.to_datetime(pxHistory['date'], format='%Y-%m-%d %H:%M:%S')
+        pxHistory['date'] = _parseDbDates(pxHistory['date'], pxHistory['interval'].iloc[0])
+    # same resolution whichever way the dates were read, and the same as the columnar cache 
+    pxHistory['date'] = pxHistory['date'].astype('datetime64[ns]')
     
-    pxHistory.sort_values(by='date', inplace=True) #sort by date
+    # tables are almost always stored in date order, skip the sort when they are
+    if not pxHistory['date'].is_monotonic_increasing:
+        pxHistory.sort_values(by='date', inplace=True) #sort by date
     
     return pxHistory
 
@@ -182,15 +377,262 @@ def saveHistoryToDB(history, conn, earliestTimestamp=''):
     
     # Write the dataframe to the database with the correctly formatted table name
     tableName = history['symbol'][0]+'_'+type+'_'+history['interval'][0]
-    history.to_sql(f"{tableName}", conn, index=False, if_exists='append')
+
+    # store dates the same way to_sql does 
+    history = history.copy()
+    if pd.api.types.is_datetime64_any_dtype(history['date']):
+        history['date'] = history['date'].map(str)
+    history['epoch'] = _toEpoch(_parseDbDates(history['date'], history['interval'].iloc[0]))
+
+    # create the table if this is the first time we see the symbol
+    tableExists = conn.execute('SELECT name FROM sqlite_master WHERE type = \'table\' AND name = ?', (tableName,)).fetchone()
+    if tableExists is None:
+        history.head(0).to_sql(f"{tableName}", conn, index=False)
     
-    #make sure there are no duplicates in the resulting table
-    _removeDuplicates(tableName)
+    # make sure the table rejects duplicate dates, and has an epoch column 
+    _ensureUniqueDateIndex(conn, tableName)
+    _backfillEpoch(conn, tableName)
+
+    ## insert the new records in a single transaction, records that are already in the table are skipped 
+    tableColumns = [row[1] for row in conn.execute('PRAGMA table_info("%s")'%(tableName))]
+    columns = [column for column in history.columns if column in tableColumns]
+    records = history[columns].astype(object)
+    records = records.where(records.notna(), None).values.tolist()
+    sqlStatement = 'INSERT OR IGNORE INTO "%s" (%s) VALUES (%s)'%(tableName, ', '.join('"%s"'%(column) for column in columns), ', '.join(['?'] * len(columns)))
+    with conn:
+        conn.executemany(sqlStatement, records)
+    _updateSeasonality(conn, tableName)
 
     ## make sure the records lookup table is kept updated
     #if earliestTimestamp:
     _updateLookup_symbolRecords(conn, tableName, earliestTimestamp=earliestTimestamp)
 
+"""
+utility - makes sure the date column of a px history table is indexed so date range 
+queries do not scan the whole table. Index is created the first time the table is seen.
+
+Params
+==========
+tablename - [str]
+"""
+def _ensureDateIndex(conn, tablename):
+    cursor = conn.execute('SELECT name FROM sqlite_master WHERE type = \'index\' AND tbl_name = ? AND sql LIKE \'%(date)%\'', (tablename,))
+    if cursor.fetchone() is None:
+        conn.execute('CREATE INDEX IF NOT EXISTS "idx_%s_date" ON "%s" (date)'%(tablename, tablename))
+        conn.commit()
+
+"""
+utility - writer side, brings a px history table up to the current layout: date index, epoch column 
+and seasonality accumulators. Readers never call this, see _migrateDb(). 
+"""
+def _migratePxTable(conn, tablename):
+    _ensureDateIndex(conn, tablename)
+    _backfillEpoch(conn, tablename)
+    _updateSeasonality(conn, tablename)
+
+"""
+migrates every px history table listed in the lookup table of the db, see _migratePxTable(). 
+Run it from the writer side, e.g. by the ingestion process after it saved new records. 
+Dbs without a lookup table (e.g. the term structure db) are left untouched. 
+"""
+def _migrateDb(db_name):
+    try:
+        with connectionPool.writer(db_name) as conn:
+            _migrateTables(conn)
+    except sqlite3.OperationalError:
+        return # read-only db file
+
+""" migrates the px history tables listed in the lookup table of a writable connection, see _migrateDb() """
+def _migrateTables(conn):
+    if not _tableExists(conn, '00-lookup_symbolRecords'):
+        return
+    tablenames = [row[0] for row in conn.execute('SELECT name FROM \'00-lookup_symbolRecords\'').fetchall()]
+    for tablename in tablenames:
+        if _tableExists(conn, tablename):
+            _migratePxTable(conn, tablename)
+
+""" formats a timestamp the way dates are stored in the px history tables """
+def _formatDbDate(timestamp):
+    if timestamp == timestamp.normalize():
+        return timestamp.strftime('%Y-%m-%d')
+    return timestamp.strftime('%Y-%m-%d %H:%M:%S')
+
+"""
+Resolves start, end and lookback into a [start, end) range of timestamps, None if unbounded
+
+Params
+==========
+start - [str|datetime] first date to include 
+end - [str|datetime] last date to include, whole day is included if no time is set
+lookback - [int] number of days before the last record in the table to include 
+"""
+def _resolveDateRange(conn, tablename, start=None, end=None, lookback=None):
+    if start is not None:
+        start = pd.Timestamp(start)
+
+    if end is not None:
+        end = pd.Timestamp(end)
+        # make the end bound exclusive 
+        if end == end.normalize():
+            end = end + pd.Timedelta(days=1)
+        else:
+            end = end + pd.Timedelta(seconds=1)
+
+    if lookback:
+        maxDate = conn.execute('SELECT MAX(date) FROM "%s"'%(tablename)).fetchone()[0]
+        # empty table, nothing to look back from 
+        if maxDate is None:
+            return start, end
+        lookbackStart = pd.Timestamp(maxDate[:19]).normalize() - pd.Timedelta(days=lookback)
+        if start is None or lookbackStart > start:
+            start = lookbackStart
+
+    return start, end
+
+""" returns the sql WHERE clause and its params selecting [start, end) """
+def _dateRangeClause(start=None, end=None):
+    conditions = []
+    params = []
+    if start is not None:
+        conditions.append('date >= ?')
+        params.append(_formatDbDate(start))
+    if end is not None:
+        conditions.append('date < ?')
+        params.append(_formatDbDate(end))
+    if not conditions:
+        return '', params
+    return ' WHERE ' + ' AND '.join(conditions), params
+
+""" 
+returns the sql select list for the requested columns of the table, plus the columns needed to 
+format px history and compute returns 
+"""
+def _selectList(conn, tablename, columns=None):
+    if columns is None:
+        return '*'
+    required = set(columns) | {'date', 'close', 'epoch', 'interval'}
+    tableColumns = [column[1] for column in conn.execute('PRAGMA table_info("%s")'%(tablename)).fetchall()]
+    return ', '.join('"%s"'%(column) for column in tableColumns if column in required)
+
+"""
+Reads a px history table from the db, formats it and adds log returns 
+
+If a date range is passed in, only the range is read, plus the record right before it 
+so returns on the first record of the range are the same as on a full read.
+"""
+def _readPxHistory(conn, tablename, start=None, end=None, columns=None):
+    selectList = _selectList(conn, tablename, columns)
+    if start is None and end is None:
+        sqlStatement = 'SELECT %s FROM "%s"'%(selectList, tablename)
+        pxHistory = pd.read_sql(sqlStatement, conn)
+    else:
+        whereClause, params = _dateRangeClause(start, end)
+        sqlStatement = 'SELECT %s FROM "%s"%s'%(selectList, tablename, whereClause)
+        if start is not None:
+            sqlStatement = 'SELECT * FROM (SELECT %s FROM "%s" WHERE date < ? ORDER BY date DESC LIMIT 1) UNION ALL SELECT * FROM (%s)'%(selectList, tablename, sqlStatement)
+            params.insert(0, _formatDbDate(start))
+        pxHistory = pd.read_sql(sqlStatement, conn, params=params)
+
+    pxHistory = _formatpxHistory(pxHistory)
+
+    # caclulate log returns
+    pxHistory = ut.calcLogReturns(pxHistory, 'close')
+
+    return pxHistory
+
+"""
+Returns formatted px history for the table, served from the in-process LRU or the columnar cache if they are 
+up to date with the table, otherwise read from the db. Full reads are written to the caches that are switched on. 
+
+Params
+==========
+tablename - [str]
+withpctChange - [bool] add pctChange column
+start, end, lookback - optional date range, see _resolveDateRange()
+columns, compact, withCalendar - see _selectPxHistory()
+"""
+def _loadPxHistory(conn, tablename, withpctChange=False, start=None, end=None, lookback=None, columns=None, compact=False, withCalendar=False):
+    start, end = _resolveDateRange(conn, tablename, start, end, lookback)
+
+    pxHistory = None
+    dbPath = _dbPath(conn)
+    useDiskCache = config.usePxCache and dbPath
+    useMemoryCache = config.usePxMemoryCache and dbPath
+    if useDiskCache or useMemoryCache:
+        version = pxCache.getDataVersion(conn, tablename)
+    if useMemoryCache:
+        pxHistory = pxCache.memory.get(dbPath, tablename, version, _cachedColumns(columns), start, end)
+
+    if pxHistory is None and useDiskCache:
+        pxHistory = pxCache.read(dbPath, tablename, version)
+        if pxHistory is None and start is None and end is None:
+            pxHistory = _readPxHistory(conn, tablename)
+            pxCache.write(dbPath, tablename, version, pxHistory)
+        if pxHistory is not None and useMemoryCache:
+            pxCache.memory.put(dbPath, tablename, version, pxHistory)
+    elif pxHistory is None and useMemoryCache and start is None and end is None:
+        pxHistory = _readPxHistory(conn, tablename)
+        pxCache.memory.put(dbPath, tablename, version, pxHistory)
+
+    # cache is stale or disabled, push the date range and columns down to the db 
+    if pxHistory is None:
+        pxHistory = _readPxHistory(conn, tablename, start, end, columns)
+
+    return _selectPxHistory(pxHistory, withpctChange, start, end, columns, compact, withCalendar)
+
+""" returns the columns of cached px history needed to serve the requested columns """
+def _cachedColumns(columns=None):
+    if columns is None:
+        return None
+    return list(dict.fromkeys(['date'] + list(columns) + ['close', 'logReturn']))
+
+""" 
+adds pctChange if requested and selects [start, end) of loaded px history 
+
+Params
+===========
+columns - [list of str] optional, stored columns to return, date and the return columns are always returned 
+compact - [bool] return compact dtypes, see _compactPxHistory() 
+withCalendar - [bool] add the calendar key columns, see utils_calendar.attachCalendar() 
+"""
+def _selectPxHistory(pxHistory, withpctChange=False, start=None, end=None, columns=None, compact=False, withCalendar=False):
+    if withpctChange:
+        pxHistory.insert(pxHistory.columns.get_loc('logReturn'), 'pctChange', rt.simpleReturns(pxHistory['close'].to_numpy()))
+
+    # select just the requested range 
+    if start is not None or end is not None:
+        inRange = pd.Series(True, index=pxHistory.index)
+        if start is not None:
+            inRange &= pxHistory['date'] >= start
+        if end is not None:
+            inRange &= pxHistory['date'] < end
+        pxHistory = pxHistory[inRange].reset_index(drop=True)
+
+    if columns is not None:
+        pxHistory = pxHistory[[column for column in pxHistory.columns if column in columns or column in ('date', 'pctChange', 'logReturn')]]
+    if compact:
+        pxHistory = _compactPxHistory(pxHistory)
+    if withCalendar:
+        pxHistory = cal.attachCalendar(pxHistory.copy(deep=False))
+
+    return pxHistory
+
+"""
+Returns px history with compact dtypes: categorical symbol/interval, float32 prices and returns, 
+and integer volume where the volume is whole 
+"""
+def _compactPxHistory(pxHistory):
+    pxHistory = pxHistory.copy(deep=False)
+    for column in pxHistory.columns:
+        values = pxHistory[column]
+        if column in ('symbol', 'interval'):
+            pxHistory[column] = values.astype('category')
+        elif column in ('volume', 'barCount') and pd.api.types.is_float_dtype(values) and values.notna().all() and (values % 1 == 0).all():
+            pxHistory[column] = values.astype('int64')
+        elif values.dtype == 'float64':
+            pxHistory[column] = values.astype('float32')
+    return pxHistory
+
 """
 Returns dataframe of px from database 
 
@@ -198,33 +640,458 @@ Params
 ===========
 symbol - [str]
 interval - [str] 
-lookback - [str] optional 
+start - [str|datetime] optional, first date to return 
+end - [str|datetime] optional, last date to return 
+lookback - [int] optional, number of days before the last record to return 
+columns - [list of str] optional, stored columns to read (e.g. ['close', 'volume']), date and the return columns are always returned 
+compact - [bool] return categorical symbol/interval, float32 prices/returns and integer volume 
+withCalendar - [bool] add calendar key columns (year, month, day, dayOfWeek, businessDayOfMonth, holiday, minuteOfDay, inSession) 
 
 """
-def getPriceHistory(conn, symbol, interval, withpctChange=True, lastTradeMonth=''):
+def getPriceHistory(conn, symbol, interval, withpctChange=True, lastTradeMonth='', start=None, end=None, lookback=None, columns=None, compact=False, withCalendar=False):
     if lastTradeMonth:
         tableName = symbol+'_'+lastTradeMonth+'_'+interval
     else:
         tableName = _constructTableName(symbol, interval)
-    sqlStatement = 'SELECT * FROM '+tableName
-    pxHistory = pd.read_sql(sqlStatement, conn)
+
+    # intervals without a stored table are resampled from a finer one 
+    if not lastTradeMonth and interval in _intervalOffsets and not _tableExists(conn, tableName):
+        return getResampledPriceHistory(conn, symbol, interval, withpctChange=withpctChange, start=start, end=end, lookback=lookback, columns=columns, compact=compact, withCalendar=withCalendar)
     
-    if withpctChange:
-        pxHistory['pctChange'] = pxHistory['close'].pct_change()
+    return _loadPxHistory(conn, tableName, withpctChange=withpctChange, start=start, end=end, lookback=lookback, columns=columns, compact=compact, withCalendar=withCalendar)
 
-    pxHistory = _formatpxHistory(pxHistory)
+def getPriceHistoryWithTablename(conn, tablename, start=None, end=None, lookback=None, columns=None, compact=False):
+    return _loadPxHistory(conn, tablename, start=start, end=end, lookback=lookback, columns=columns, compact=compact)
 
-    # caclulate log returns
-    pxHistory = ut.calcLogReturns(pxHistory, 'close')
-    
-    return pxHistory
+""" returns true if the table exists in the db """
+def _tableExists(conn, tablename):
+    return conn.execute('SELECT 1 FROM sqlite_master WHERE type = \'table\' AND name = ?', [tablename]).fetchone() is not None
+
+""" 
+Resamples px history into bars of a coarser interval 
+    - bars never span two sessions: intraday bars are aligned on the clock (e.g. 1hour bars start on the hour, 
+      the first one at the session open), daily bars hold one calendar day and are dated at midnight 
+    - open is the first open, high/low the max/min, close the last close, volume the sum of the bars in each bucket 
+
+Params
+===========
+pxHistory - [DataFrame] formatted px history, see getPriceHistory() 
+interval - [str] target interval, one of _intervalOffsets 
+sessionStart, sessionEnd - [str] optional 'HH:MM', only bars starting in [sessionStart, sessionEnd) are used, 
+    e.g. '09:30', '16:00' to drop extended hours 
+
+"""
+def resamplePxHistory(pxHistory, interval, sessionStart=None, sessionEnd=None):
+    pxHistory = pxHistory.drop(columns=[column for column in ['pctChange', 'logReturn'] if column in pxHistory.columns])
+
+    if sessionStart is not None or sessionEnd is not None:
+        timeOfDay = pxHistory['date'] - pxHistory['date'].dt.normalize()
+        inSession = pd.Series(True, index=pxHistory.index)
+        if sessionStart is not None:
+            inSession &= timeOfDay >= pd.Timedelta(sessionStart + ':00')
+        if sessionEnd is not None:
+            inSession &= timeOfDay < pd.Timedelta(sessionEnd + ':00')
+        pxHistory = pxHistory[inSession]
+
+    if interval == '1day':
+        buckets = pxHistory['date'].dt.normalize()
+    else:
+        buckets = pxHistory['date'].dt.floor(_intervalOffsets[interval])
+
+    # intraday bars are labelled with the time of their first bar, so the first bar of a session starts at the open 
+    aggregations = {column: _barAggregations.get(column, 'last') for column in pxHistory.columns}
+    if interval == '1day':
+        aggregations.pop('date')
+    bars = pxHistory.groupby(buckets.rename('bucket'), sort=True).agg(aggregations)
+    if interval == '1day':
+        bars.insert(0, 'date', bars.index)
+    bars = bars.reset_index(drop=True)
+    if 'interval' in bars.columns:
+        bars['interval'] = interval
+
+    return bars
+
+"""
+Returns px history for an interval derived from the stored table of a finer interval of the symbol, 
+e.g. 1hour bars from the 30mins table. Resampled bars are cached per data version of the source table. 
+
+Params
+===========
+symbol - [str]
+interval - [str] target interval, one of _intervalOffsets 
+sessionStart, sessionEnd - [str] optional 'HH:MM' restricted hours, see resamplePxHistory() 
+start, end, lookback, columns, compact, withCalendar - see getPriceHistory() 
+
+"""
+def getResampledPriceHistory(conn, symbol, interval, withpctChange=True, sessionStart=None, sessionEnd=None, start=None, end=None, lookback=None, columns=None, compact=False, withCalendar=False):
+    sourceInterval = _resampleSource(conn, symbol, interval)
+    if sourceInterval is None:
+        raise sqlite3.OperationalError('no table of %s to resample %s bars from'%(symbol, interval))
+    sourceTablename = _constructTableName(symbol, sourceInterval)
+
+    start, end = _resolveDateRange(conn, sourceTablename, start, end, lookback)
+
+    # cache entries are tagged with the source table version and the session hours 
+    tablename = _constructTableName(symbol, interval)
+    if sessionStart is not None or sessionEnd is not None:
+        tablename = '%s_%s-%s'%(tablename, sessionStart, sessionEnd)
+
+    pxHistory = None
+    dbPath = _dbPath(conn)
+    useDiskCache = config.usePxCache and dbPath
+    useMemoryCache = config.usePxMemoryCache and dbPath
+    if useDiskCache or useMemoryCache:
+        version = [sourceTablename] + pxCache.getDataVersion(conn, sourceTablename)
+    if useMemoryCache:
+        pxHistory = pxCache.memory.get(dbPath, tablename, version, _cachedColumns(columns), start, end)
+    if pxHistory is None and useDiskCache:
+        pxHistory = pxCache.read(dbPath, tablename, version)
+        if pxHistory is not None and useMemoryCache:
+            pxCache.memory.put(dbPath, tablename, version, pxHistory)
+
+    if pxHistory is None:
+        pxHistory = resamplePxHistory(_loadPxHistory(conn, sourceTablename), interval, sessionStart, sessionEnd)
+        pxHistory = ut.calcLogReturns(pxHistory, 'close')
+        if useDiskCache:
+            pxCache.write(dbPath, tablename, version, pxHistory)
+        if useMemoryCache:
+            pxCache.memory.put(dbPath, tablename, version, pxHistory)
+
+    return _selectPxHistory(pxHistory, withpctChange, start, end, columns, compact, withCalendar)
+
+""" 
+returns the stored interval of the symbol to resample the target interval from: the coarsest one 
+that evenly divides the target, finer tables hold the same bars at a higher read cost and usually less history 
+"""
+def _resampleSource(conn, symbol, interval):
+    target = pd.Timedelta(_intervalOffsets[interval])
+    candidates = sorted(_intervalOffsets, key=lambda candidate: pd.Timedelta(_intervalOffsets[candidate]), reverse=True)
+    for candidate in candidates:
+        step = pd.Timedelta(_intervalOffsets[candidate])
+        if step < target and target % step == pd.Timedelta(0) and _tableExists(conn, _constructTableName(symbol, candidate)):
+            return candidate
+    return None
+
+"""
+Yields px history in date ordered chunks instead of loading the whole table, for consumers that 
+only aggregate over very large intraday tables. 
+    - every chunk has the same columns and dtypes, numeric columns are float64
+    - logReturn (and pctChange) of the first row of a chunk is computed from the last close of the previous chunk
+
+Params
+===========
+symbol - [str]
+interval - [str] 
+chunkSize - [int] number of records per chunk 
+start, end, lookback - optional date range, see getPriceHistory()
+
+"""
+def iterPriceHistory(conn, symbol, interval, chunkSize=100000, withpctChange=False, lastTradeMonth='', start=None, end=None, lookback=None):
+    if lastTradeMonth:
+        tableName = symbol+'_'+lastTradeMonth+'_'+interval
+    else:
+        tableName = _constructTableName(symbol, interval)
+
+    start, end = _resolveDateRange(conn, tableName, start, end, lookback)
+
+    # declared column types decide the chunk dtypes, so a chunk of all-integer or all-null values does not change them 
+    numericColumns = [column[1] for column in conn.execute('PRAGMA table_info("%s")'%(tableName)).fetchall() if column[2].upper() in ('REAL', 'INTEGER', 'FLOAT', 'NUMERIC')]
+
+    # returns of the first record are computed from the last close before start 
+    prevClose = None
+    if start is not None:
+        row = conn.execute('SELECT close FROM "%s" WHERE date < ? ORDER BY date DESC LIMIT 1'%(tableName), [_formatDbDate(start)]).fetchone()
+        if row is not None:
+            prevClose = row[0]
+
+    whereClause, params = _dateRangeClause(start, end)
+    cursor = conn.execute('SELECT * FROM "%s"%s ORDER BY date'%(tableName, whereClause), params)
+    columns = [description[0] for description in cursor.description]
+
+    while True:
+        records = cursor.fetchmany(chunkSize)
+        if not records:
+            break
+
+        chunk = pd.DataFrame.from_records(records, columns=columns)
+        for column in numericColumns:
+            chunk[column] = chunk[column].astype('float64')
+        chunk = _formatpxHistory(chunk)
+        chunk = ut.calcLogReturns(chunk, 'close')
+        if withpctChange:
+            chunk.insert(chunk.columns.get_loc('logReturn'), 'pctChange', rt.simpleReturns(chunk['close'].to_numpy()))
+
+        # carry the previous close across the chunk boundary 
+        if prevClose is not None:
+            chunk.loc[0, 'logReturn'] = round(math.log(chunk['close'].iloc[0]) - math.log(prevClose), 5)
+            if withpctChange:
+                chunk.loc[0, 'pctChange'] = chunk['close'].iloc[0] / prevClose - 1
+        prevClose = chunk['close'].iloc[-1]
+
+        yield chunk
+
+"""
+Returns bars from the memory-mapped OHLCV store (see interface_barStore), exporting the table to 
+the store first if it changed since the last export. 
+
+Params
+===========
+symbol - [str]
+interval - [str] 
+start, end, lookback - optional date range, see getPriceHistory() 
+
+Returns
+===========
+dict of column arrays: int64 epoch, float32 open/high/low/close, int64 volume, see barStore.toFrame() 
+
+"""
+def getBars(conn, symbol, interval, lastTradeMonth='', start=None, end=None, lookback=None):
+    if lastTradeMonth:
+        tableName = symbol+'_'+lastTradeMonth+'_'+interval
+        symbol = symbol+'_'+lastTradeMonth
+    else:
+        tableName = _constructTableName(symbol, interval)
+
+    start, end = _resolveDateRange(conn, tableName, start, end, lookback)
+    barStore.export(conn, tableName, symbol, interval, dbPath=_dbPath(conn))
+
+    return barStore.read(symbol, interval, start, end)
+
+"""
+Exports every table in the lookup table to the OHLCV store, returns the number of tables that were updated 
+
+Params
+===========
+intervals - [list of str] optional, only export tables of these intervals 
+
+"""
+def syncBarStore(conn, intervals=None):
+    lookup = getLookup_symbolRecords(conn)
+    if intervals is not None:
+        lookup = lookup[lookup['interval'].isin(intervals)]
+
+    numUpdated = 0
+    for tablename, symbol, interval in zip(lookup['name'], lookup['symbol'], lookup['interval']):
+        numUpdated += barStore.export(conn, tablename, symbol, interval, dbPath=_dbPath(conn))
+
+    return numUpdated
+
+"""
+Returns mean and std of a column per calendar bucket, computed inside sqlite so the table is never loaded into pandas. 
+Same output as utils.aggregate_by_month / aggregate_by_dayOfWeek / aggregate_by_timestamp on the loaded px history. 
+
+Params
+===========
+symbol - [str]
+interval - [str] 
+by - [str] bucket, one of 'month', 'dayOfWeek', 'timestamp' 
+targetCol - [str] 'logReturn' or a stored column, e.g. 'volume' 
+sessionStart, sessionEnd - [str] optional 'HH:MM', only records in [sessionStart, sessionEnd) are aggregated, 
+    returns of the first record of a session are still computed from the previous record 
+start, end, lookback - optional date range, see getPriceHistory() 
+
+"""
+def aggregatePxHistory(conn, symbol, interval, by='timestamp', targetCol='logReturn', sessionStart=None, sessionEnd=None, start=None, end=None, lookback=None):
+    tableName = _constructTableName(symbol, interval)
+    start, end = _resolveDateRange(conn, tableName, start, end, lookback)
+    _ensureLn(conn)
+
+    bucketColumn = _calendarKeySql(conn, tableName, {'month': 'month', 'dayOfWeek': 'dayOfWeek', 'timestamp': 'minuteOfDay'}[by])
+    minuteOfDay = _calendarKeySql(conn, tableName, 'minuteOfDay')
+    if targetCol == 'logReturn':
+        value = 'ROUND(ln(close) - ln(LAG(close) OVER (ORDER BY date)), 5)'
+    else:
+        value = '"%s"'%(targetCol)
+
+    # the record before start is read too, it is needed for the return of the first record 
+    innerWhere = ''
+    params = []
+    if start is not None:
+        innerWhere = ' WHERE date >= COALESCE((SELECT MAX(date) FROM "%s" WHERE date < ?), ?)'%(tableName)
+        params += [_formatDbDate(start)] * 2
+    innerSql = 'SELECT date, %s AS bucket, %s AS minuteOfDay, %s AS value FROM "%s"%s'%(bucketColumn, minuteOfDay, value, tableName, innerWhere)
+
+    whereClause, outerParams = _dateRangeClause(start, end)
+    conditions = [whereClause[len(' WHERE '):]] if whereClause else []
+    if sessionStart is not None:
+        conditions.append('minuteOfDay >= %s'%(cal.minuteOfDay(sessionStart)))
+    if sessionEnd is not None:
+        conditions.append('minuteOfDay < %s'%(cal.minuteOfDay(sessionEnd)))
+    conditions.append('value IS NOT NULL')
+
+    sqlStatement = 'SELECT bucket, COUNT(value) AS n, SUM(value) AS s, SUM(value * value) AS ss FROM (%s) WHERE %s GROUP BY bucket ORDER BY bucket'%(innerSql, ' AND '.join(conditions))
+    sums = pd.read_sql(sqlStatement, conn, params=params + outerParams)
+
+    aggregate = pd.DataFrame({by: sums['bucket']})
+    means = sums['s'] / sums['n']
+    m2 = (sums['ss'] - sums['s'] * means).clip(lower=0)
+    aggregate['mean'], aggregate['std'] = sz.finalizeMoments(sums['n'], means, m2)
+    if by == 'timestamp':
+        aggregate[by] = cal.formatMinuteOfDay(sums['bucket'])
+
+    return aggregate
+
+""" registers ln() on connections to sqlite builds compiled without the math functions """
+def _ensureLn(conn):
+    try:
+        conn.execute('SELECT ln(1)')
+    except sqlite3.OperationalError:
+        conn.create_function('ln', 1, lambda x: math.log(x) if x is not None and x > 0 else None, deterministic=True)
+
+"""
+utility - creates the tables holding the seasonality accumulators, see _updateSeasonality()
+"""
+def _ensureSeasonalityTables(conn):
+    conn.execute('CREATE TABLE IF NOT EXISTS "%s" (tablename TEXT, bucket TEXT, key INTEGER, n INTEGER, mean REAL, m2 REAL, PRIMARY KEY (tablename, bucket, key))'%(_seasonalityTable))
+    conn.execute('CREATE TABLE IF NOT EXISTS "%s" (tablename TEXT PRIMARY KEY, lastRowid INTEGER, lastEpoch INTEGER, lastClose REAL)'%(_seasonalityWatermarkTable))
+
+"""
+utility - returns count, mean and M2 of the close to close logReturn of the records per seasonality bucket 
+(month, dayOfMonth, dayOfWeek, timestamp) and bucket key, see utils_seasonality.buckets
+
+Params
+==========
+records - [DataFrame] epoch and close of consecutive records, sorted by epoch
+prevClose - [float] close of the record before the first one, None if there is none
+"""
+def _seasonalityBatch(records, prevClose=None):
+    close = records['close'].to_numpy(dtype='float64')
+    previous = np.concatenate([[np.nan if prevClose is None else prevClose], close[:-1]])
+    # same definition as aggregatePxHistory() and utils.calcLogReturns()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        logReturn = np.round(np.log(close) - np.log(previous), 5)
+    calendar = cal.attachCalendar(pd.DataFrame({'date': pd.to_datetime(records['epoch'].to_numpy(), unit='s')}))
+
+    batches = []
+    for bucketName, (keyColumn, _, minKey) in sz.buckets.items():
+        keys = calendar[keyColumn].to_numpy().astype('int64')
+        mask = np.isfinite(logReturn) & (keys >= minKey)
+        present, counts, means, m2 = sz.bucketMoments(keys[mask], logReturn[mask])
+        batches.append(pd.DataFrame({'bucket': bucketName, 'key': present, 'n': counts, 'mean': means, 'm2': m2}))
+
+    return pd.concat(batches, ignore_index=True)
+
+"""
+utility - merges two sets of seasonality accumulators, the count, mean and M2 of each bucket key 
+are combined with the parallel form of Welford's update
+"""
+def _mergeSeasonality(accumulators, batch):
+    accumulators, batch = accumulators.set_index(['bucket', 'key']).align(batch.set_index(['bucket', 'key']), join='outer', fill_value=0)
+    n, mean, m2 = sz.mergeMoments(*(accumulators[column].to_numpy(dtype='float64') for column in ['n', 'mean', 'm2']), *(batch[column].to_numpy(dtype='float64') for column in ['n', 'mean', 'm2']))
+    return pd.DataFrame({'n': n.astype('int64'), 'mean': mean, 'm2': m2}, index=accumulators.index).reset_index()
+
+"""
+utility - keeps the seasonality accumulators of a px history table current. Only records added since 
+the last update are read and folded in. Records older than the last folded one change the returns 
+around them, the accumulators of the table are rebuilt from all records when that happens.
+
+Params
+==========
+tablename - [str]
+"""
+def _updateSeasonality(conn, tablename):
+    _ensureSeasonalityTables(conn)
+    watermark = conn.execute('SELECT lastRowid, lastEpoch, lastClose FROM "%s" WHERE tablename = ?'%(_seasonalityWatermarkTable), [tablename]).fetchone()
+    lastRowid, lastEpoch, lastClose = watermark if watermark is not None else (0, None, None)
+
+    sqlStatement = 'SELECT ROWID AS rid, epoch, close FROM "%s" WHERE ROWID > ? AND epoch IS NOT NULL ORDER BY epoch'%(tablename)
+    records = pd.read_sql(sqlStatement, conn, params=[lastRowid])
+    if records.empty:
+        return
+
+    if lastEpoch is not None and records['epoch'].iloc[0] <= lastEpoch:
+        lastClose = None
+        records = pd.read_sql(sqlStatement, conn, params=[0])
+        accumulators = _seasonalityBatch(records)
+    else:
+        accumulators = pd.read_sql('SELECT bucket, key, n, mean, m2 FROM "%s" WHERE tablename = ?'%(_seasonalityTable), conn, params=[tablename])
+        accumulators = _mergeSeasonality(accumulators, _seasonalityBatch(records, lastClose))
+
+    lastClose = records['close'].iloc[-1]
+    with conn:
+        conn.execute('DELETE FROM "%s" WHERE tablename = ?'%(_seasonalityTable), [tablename])
+        conn.executemany('INSERT INTO "%s" (tablename, bucket, key, n, mean, m2) VALUES (?, ?, ?, ?, ?, ?)'%(_seasonalityTable), 
+                         [(tablename, bucket, int(key), int(n), float(mean), float(m2)) for bucket, key, n, mean, m2 in accumulators[['bucket', 'key', 'n', 'mean', 'm2']].itertuples(index=False)])
+        conn.execute('INSERT OR REPLACE INTO "%s" (tablename, lastRowid, lastEpoch, lastClose) VALUES (?, ?, ?, ?)'%(_seasonalityWatermarkTable), 
+                     [tablename, int(records['rid'].max()), int(records['epoch'].iloc[-1]), None if pd.isna(lastClose) else float(lastClose)])
+
+""" utility - True if records were added to the table since its seasonality accumulators were last updated """
+def _seasonalityStale(conn, tablename):
+    try:
+        watermark = conn.execute('SELECT lastRowid FROM "%s" WHERE tablename = ?'%(_seasonalityWatermarkTable), [tablename]).fetchone()
+    except sqlite3.OperationalError:
+        return True # accumulator tables not created yet
+    return watermark is None or (conn.execute('SELECT MAX(ROWID) FROM "%s"'%(tablename)).fetchone()[0] or 0) > watermark[0]
+
+"""
+Returns mean and std of the close to close logReturn of a symbol per seasonality bucket over its full history, 
+read from the accumulators kept by saveHistoryToDB() and _migrateDb() instead of scanning the table. 
+Tables whose accumulators are behind are folded in memory, readers never update them. 
+
+Params
+===========
+symbol - [str]
+interval - [str]
+by - [str] one of month, dayOfMonth (business day of the month), dayOfWeek, timestamp (time of day)
+sessionStart, sessionEnd - [str] 'HH:MM', optional, only buckets with sessionStart <= time of day < sessionEnd, by timestamp only
+
+Returns
+===========
+DataFrame with columns [by, mean, std], same as utils.aggregate_by_*()
+
+"""
+def getSeasonality(conn, symbol, interval, by='month', sessionStart=None, sessionEnd=None):
+    tableName = _constructTableName(symbol, interval)
+
+    if not _seasonalityStale(conn, tableName):
+        accumulators = pd.read_sql('SELECT key, n, mean, m2 FROM "%s" WHERE tablename = ? AND bucket = ? ORDER BY key'%(_seasonalityTable), conn, params=[tableName, by])
+    else:
+        # accumulators are behind the table (saved by another writer, or not migrated yet), fold the whole table in memory 
+        records = pd.read_sql('SELECT date, close FROM "%s"'%(tableName), conn)
+        records['epoch'] = _toEpoch(_parseDbDates(records['date'], interval))
+        accumulators = _seasonalityBatch(records.sort_values(by='epoch'))
+        accumulators = accumulators[accumulators['bucket'] == by].drop(columns='bucket').reset_index(drop=True)
+
+    if by == 'timestamp' and sessionStart is not None:
+        accumulators = accumulators[accumulators['key'] >= cal.minuteOfDay(sessionStart)]
+    if by == 'timestamp' and sessionEnd is not None:
+        accumulators = accumulators[accumulators['key'] < cal.minuteOfDay(sessionEnd)]
+
+    means, stds = sz.finalizeMoments(accumulators['n'], accumulators['mean'], accumulators['m2'])
+    aggregate = pd.DataFrame({by: accumulators['key'].to_numpy(), 'mean': means, 'std': stds})
+    if by == 'timestamp':
+        aggregate[by] = cal.formatMinuteOfDay(aggregate[by])
+
+    return aggregate
+
+"""
+Returns the close of several tables side by side in one query, e.g. the contracts of a futures curve 
+
+Params
+===========
+tablenames - [list of str] 
+interval - [str] interval of the tables 
+
+Returns
+===========
+DataFrame with a date column and one close column per table (named after the table), 
+dates missing in a table are NaN
+
+"""
+def getCloseMatrix(conn, tablenames, interval='1day'):
+    tablenames = list(tablenames)
+    sql = ' UNION ALL '.join('SELECT date, close, %s AS tablename FROM "%s"'%(i, tablename) for i, tablename in enumerate(tablenames))
+    closes = pd.read_sql(sql, conn)
+    closes['date'] = _parseDbDates(closes['date'], interval)
+
+    # tables that predate the unique date index may hold duplicate dates 
+    closes = closes.drop_duplicates(subset=['tablename', 'date'], keep='last')
+    closes = closes.pivot(index='date', columns='tablename', values='close')
+    closes = closes.reindex(columns=range(len(tablenames)))
+    closes.columns = tablenames
+
+    return closes.rename_axis(columns=None).reset_index()
 
-def getPriceHistoryWithTablename(conn, tablename):
-    sqlStatement = 'SELECT * FROM '+tablename
-    pxHistory = pd.read_sql(sqlStatement, conn)
-    pxHistory = _formatpxHistory(pxHistory)
-    pxHistory = ut.calcLogReturns(pxHistory, 'close')
-    return pxHistory
 """ 
 Returns the lookup table fo records history as df 
 """
@@ -255,12 +1122,42 @@ def listSymbols(conn):
         value of the target cell
 """
 def futures_getCellValue(conn, symbol, interval='1day', lastTradeMonth='202308', targetColumn='close', targetDate='2023-07-21'):
-    # construct tablename
-    tableName = symbol+'_'+str(lastTradeMonth)+'_'+interval
-    targetDate = '2023-07-21 00:00:00'
-    # run sql query to get cell value 
-    sqlStatement = 'SELECT '+targetColumn+' FROM '+tableName+' WHERE date = \''+targetDate+'\''
-
-    value = pd.read_sql(sqlStatement, conn)
-    # return val 
-    return value[targetColumn][0]
\ No newline at end of file
+    value = futures_getCellValues(conn, symbol, [(lastTradeMonth, targetDate)], targetColumn=targetColumn, interval=interval)[0]
+    if pd.isna(value):
+        raise KeyError('no %s record for %s %s on %s'%(interval, symbol, lastTradeMonth, targetDate))
+    return value
+
+"""
+    Returns values of a column for many (contract, date) pairs, with one query per contract table 
+    inputs:
+        symbol: str
+        cells: list of (lastTradeMonth, date) tuples, lastTradeMonth as YYYYMM, date as str or datetime 
+        targetColumn: str, column we want from the db tables 
+        interval: str, daily dates match any time on the day, intraday dates match exactly 
+    outputs:
+        numpy array of values in the order of cells, NaN where the contract has no record on the date 
+"""
+def futures_getCellValues(conn, symbol, cells, targetColumn='close', interval='1day'):
+    values = np.full(len(cells), np.nan)
+    if not len(cells):
+        return values
+
+    cells = pd.DataFrame(cells, columns=['lastTradeMonth', 'date'])
+    cells['lastTradeMonth'] = cells['lastTradeMonth'].astype(str)
+    cells['date'] = pd.to_datetime(cells['date'])
+    if interval == '1day':
+        cells['date'] = cells['date'].dt.normalize()
+
+    for lastTradeMonth, requested in cells.groupby('lastTradeMonth'):
+        tableName = symbol+'_'+lastTradeMonth+'_'+interval
+
+        # one range scan on the date index covering every requested date of the contract 
+        start, end = requested['date'].min(), requested['date'].max() + (pd.Timedelta(days=1) if interval == '1day' else pd.Timedelta(seconds=1))
+        whereClause, params = _dateRangeClause(start, end)
+        records = pd.read_sql('SELECT date, "%s" AS value FROM "%s"%s'%(targetColumn, tableName, whereClause), conn, params=params)
+
+        records['date'] = _parseDbDates(records['date'], interval)
+        records = records.drop_duplicates(subset='date', keep='last').set_index('date')['value']
+        values[requested.index.to_numpy()] = records.reindex(requested['date']).to_numpy(dtype='float64')
+
+    return values
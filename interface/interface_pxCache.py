@@ -0,0 +1,202 @@
+"""
+This module implements a columnar on-disk cache of the px history tables in the local db.
+
+    - one directory per db table, one .npy file per column
+    - every cache entry is tagged with the data version of its table (max rowid, max date)
+    - warm loads memory-map the column files instead of scanning sqlite and parsing dates
+    - tables loaded in this process are also kept in a size bounded in-memory LRU, see memoryCache, 
+      switched on and off separately with config.usePxMemoryCache
+
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import config
+
+""" Global vars """
+cacheDir = config.dbname_pxCache
+
+"""
+Returns the data version of a table, used to invalidate cached copies of the table
+
+Params
+===========
+conn - [sqlite3 connection]
+tablename - [str]
+
+"""
+def getDataVersion(conn, tablename):
+    cursor = conn.execute('SELECT MAX(ROWID), MAX(date) FROM "%s"'%(tablename))
+    maxRowid, maxDate = cursor.fetchone()
+    return [maxRowid, maxDate]
+
+""" returns the cache directory of a table, db files with the same name in different folders do not collide """
+def _tableDir(dbPath, tablename):
+    dbPath = os.path.abspath(dbPath)
+    dbKey = '%s_%s'%(os.path.basename(dbPath), hashlib.md5(dbPath.encode()).hexdigest()[:8])
+    return os.path.join(cacheDir, dbKey, tablename)
+
+"""
+Returns cached px history for the table, or None if the cache is missing or stale
+
+Params
+===========
+dbPath - [str] path of the sqlite db the table lives in
+tablename - [str]
+version - [list] current data version of the table, see getDataVersion()
+
+"""
+def read(dbPath, tablename, version):
+    tableDir = _tableDir(dbPath, tablename)
+    try:
+        with open(os.path.join(tableDir, 'meta.json')) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if meta['version'] != version:
+        return None
+
+    columns = {}
+    for column in meta['columns']:
+        if column['kind'] == 'constant':
+            continue
+        # copy-on-write memmap, callers are free to modify the returned frame
+        values = np.load(os.path.join(tableDir, column['file']), mmap_mode='c')
+        if column['kind'] == 'datetime':
+            values = values.view('datetime64[ns]')
+        columns[column['name']] = values
+
+    pxHistory = pd.DataFrame(columns, copy=False)
+    # add back constant columns (symbol, interval) in their original position
+    for i, column in enumerate(meta['columns']):
+        if column['kind'] == 'constant':
+            pxHistory.insert(i, column['name'], column['value'])
+
+    return pxHistory
+
+"""
+Writes px history to the cache, replacing any existing entry for the table
+
+Params
+===========
+dbPath - [str] path of the sqlite db the table lives in
+tablename - [str]
+version - [list] data version of the table the px history was read at
+pxHistory - [DataFrame] formatted px history
+
+"""
+def write(dbPath, tablename, version, pxHistory):
+    tableDir = _tableDir(dbPath, tablename)
+    tmpDir = tableDir + '.tmp'
+    shutil.rmtree(tmpDir, ignore_errors=True)
+    os.makedirs(tmpDir)
+
+    meta = {'version': version, 'columns': []}
+    for i, name in enumerate(pxHistory.columns):
+        values = pxHistory[name]
+        column = {'name': name, 'file': '%s.npy'%(i)}
+
+        if pd.api.types.is_datetime64_any_dtype(values):
+            column['kind'] = 'datetime'
+            np.save(os.path.join(tmpDir, column['file']), values.to_numpy(dtype='datetime64[ns]').view('int64'))
+        elif pd.api.types.is_numeric_dtype(values):
+            column['kind'] = 'array'
+            np.save(os.path.join(tmpDir, column['file']), values.to_numpy())
+        elif len(values) > 0 and (values == values.iloc[0]).all():
+            # symbol, interval etc. are the same on every row, no need to store them per row
+            column['kind'] = 'constant'
+            column['value'] = values.iloc[0]
+            del column['file']
+        else:
+            column['kind'] = 'array'
+            np.save(os.path.join(tmpDir, column['file']), values.to_numpy(dtype=str))
+        meta['columns'].append(column)
+
+    with open(os.path.join(tmpDir, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+    # swap in the new entry
+    shutil.rmtree(tableDir, ignore_errors=True)
+    os.replace(tmpDir, tableDir)
+
+"""
+Deletes the cache entries of the passed in db, or the whole cache if no db is passed in
+"""
+def clear(dbPath=None):
+    memory.clear()
+    if dbPath is None:
+        shutil.rmtree(cacheDir, ignore_errors=True)
+    else:
+        shutil.rmtree(os.path.dirname(_tableDir(dbPath, '_')), ignore_errors=True)
+
+class memoryCache(object):
+    """
+        In-process LRU of formatted px history, keyed by (db path, table) and tagged with the table's data version.
+        Frames are copied on the way in and out, so callers can modify what they get back.
+
+        inputs:
+            maxBytes: int, total size of the cached frames before the least recently used ones are evicted
+    """
+    def __init__(self, maxBytes):
+        self.maxBytes = maxBytes
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    """ 
+        returns a copy of the cached px history, or None if the table is not cached at this version. 
+        Only the passed in columns, and the [start, end) range plus the record right before start, are copied. 
+    """
+    def get(self, dbPath, tablename, version, columns=None, start=None, end=None):
+        key = (os.path.abspath(dbPath), tablename)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            pxHistory = entry[1]
+        if start is not None or end is not None:
+            dates = pxHistory['date'].to_numpy()
+            first = 0 if start is None else max(np.searchsorted(dates, pd.Timestamp(start).to_datetime64(), 'left') - 1, 0)
+            last = len(dates) if end is None else np.searchsorted(dates, pd.Timestamp(end).to_datetime64(), 'left')
+            pxHistory = pxHistory.iloc[first:last]
+        if columns is not None:
+            pxHistory = pxHistory[[column for column in pxHistory.columns if column in columns]]
+        return pxHistory.copy()
+
+    """ caches a copy of the px history, replacing older versions of the table """
+    def put(self, dbPath, tablename, version, pxHistory):
+        # deep copy also pulls memory-mapped columns off disk
+        pxHistory = pxHistory.copy()
+        nbytes = int(pxHistory.memory_usage(index=True, deep=True).sum())
+        if nbytes > self.maxBytes:
+            return
+
+        key = (os.path.abspath(dbPath), tablename)
+        with self._lock:
+            self._evict(key)
+            self._entries[key] = (version, pxHistory, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.maxBytes:
+                self._evict(next(iter(self._entries)))
+
+    def _evict(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.nbytes -= entry[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+memory = memoryCache(config.pxCache_maxBytes)
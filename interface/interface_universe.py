@@ -0,0 +1,95 @@
+"""
+This module loads px history for many symbols at once into date x symbol aligned arrays.
+
+    - symbols are read from the 00-lookup_symbolRecords catalog
+    - symbol tables are fetched concurrently, one read-only connection per worker thread
+    - close, volume and logReturn are returned as contiguous numpy blocks (rows: dates, cols: symbols)
+
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+
+from concurrent.futures import ThreadPoolExecutor
+from rich import print
+
+import config
+
+sys.path.append('..')
+from interface import interface_localDB as db
+
+class Universe:
+    """
+        inputs:
+            interval: str, interval of the tables to load
+            symbols: [str] symbols to load, defaults to every symbol in the lookup table with the target interval
+            dbPath: str, path to the px history db
+            numWorkers: int, number of threads fetching tables
+            start, end, lookback: optional date range, see interface_localDB.getPriceHistory()
+    """
+    def __init__(self, interval='1day', symbols=None, dbPath=config.dbname_stock, numWorkers=8, **kwargs):
+        self.interval = interval
+        self.dbPath = dbPath
+        self.numWorkers = numWorkers
+        self.dateRange = {key: kwargs.get(key) for key in ['start', 'end', 'lookback']}
+
+        if symbols is None:
+            symbols = self.listSymbols()
+        self.symbols = [symbol.upper() for symbol in symbols]
+
+        self.load()
+
+    """ returns symbols in the lookup table that have a record for the target interval """
+    def listSymbols(self):
+        with db.sqlite_connection(self.dbPath, readonly=True) as conn:
+            lookup = db.getLookup_symbolRecords(conn)
+        return lookup[lookup['interval'] == self.interval]['symbol'].unique().tolist()
+
+    def _loadSymbol(self, symbol):
+        try:
+            # pooled readers are per thread, so every worker gets its own read-only connection
+            pxHistory = db.getPriceHistory(db.connectionPool.reader(self.dbPath), symbol, self.interval, withpctChange=False, **self.dateRange)
+        except Exception as e:
+            print('[red]  could not load %s %s: %s[/red]'%(symbol, self.interval, e))
+            return None
+        # tables without a volume column (e.g. indexes) get NaN volume 
+        return pxHistory.reindex(columns=['date', 'close', 'volume', 'logReturn'])
+
+    """
+        fetches px history for every symbol concurrently and aligns them on the union of their dates.
+        Dates a symbol has no record for are NaN.
+    """
+    def load(self):
+        starttimer = pd.Timestamp.now()
+        with ThreadPoolExecutor(max_workers=self.numWorkers) as executor:
+            pxHistories = list(executor.map(self._loadSymbol, self.symbols))
+
+        # drop symbols that could not be loaded
+        loaded = [(symbol, pxHistory) for symbol, pxHistory in zip(self.symbols, pxHistories) if pxHistory is not None and not pxHistory.empty]
+        self.symbols = [symbol for symbol, _ in loaded]
+
+        if loaded:
+            self.dates = np.unique(np.concatenate([pxHistory['date'].to_numpy(dtype='datetime64[ns]') for _, pxHistory in loaded]))
+        else:
+            self.dates = np.array([], dtype='datetime64[ns]')
+
+        shape = (len(self.dates), len(self.symbols))
+        self.close = np.full(shape, np.nan)
+        self.volume = np.full(shape, np.nan)
+        self.logReturn = np.full(shape, np.nan)
+        for i, (_, pxHistory) in enumerate(loaded):
+            rows = np.searchsorted(self.dates, pxHistory['date'].to_numpy(dtype='datetime64[ns]'))
+            self.close[rows, i] = pxHistory['close'].to_numpy()
+            self.volume[rows, i] = pxHistory['volume'].to_numpy()
+            self.logReturn[rows, i] = pxHistory['logReturn'].to_numpy()
+
+        print('[yellow]  loaded %s symbols x %s dates in[/yellow] %.2fs'%(shape[1], shape[0], (pd.Timestamp.now() - starttimer).total_seconds()))
+
+    """
+        returns one of the aligned blocks as a date x symbol dataframe
+        inputs:
+            field: str, one of close, volume, logReturn
+    """
+    def toFrame(self, field='close'):
+        return pd.DataFrame(getattr(self, field), index=pd.DatetimeIndex(self.dates, name='date'), columns=self.symbols)
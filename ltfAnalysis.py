@@ -25,7 +25,7 @@ class ltfAnalysis:
         Load data from local db
     """
     def _loadData(self):
-        with db.sqlite_connection(config.dbname_stock) as conn:
+        with db.sqlite_connection(config.dbname_stock, readonly=True) as conn:
             return db.getPriceHistory(conn, self.symbol, self.interval)
 
     def addMomo(self, lookback):
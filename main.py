@@ -20,7 +20,7 @@ import momentumPlots as momoPlots
      helper function to list all the unique symbols in the db
 """
 def listSymbols():
-    with db.sqlite_connection(config.dbname_stock) as conn:
+    with db.sqlite_connection(config.dbname_stock, readonly=True) as conn:
         symbols = db.listSymbols(conn)
         lookup = db.getLookup_symbolRecords(conn)
 
@@ -48,10 +48,12 @@ else:
 
 
 ### load data for momentum plots
-with db.sqlite_connection(config.dbname_stock) as conn:
-    pxHistory = db.getPriceHistory(conn, symbol, '1day')
-    pxHistory_30mins = db.getPriceHistory(conn, symbol, '30mins')
-    pxHistory_5mins = db.getPriceHistory(conn, symbol, '5mins')
+with db.sqlite_connection(config.dbname_stock, readonly=True) as conn:
+    pxHistory = db.getPriceHistory(conn, symbol, '1day', compact=True)
+    pxHistory_30mins = db.getPriceHistory(conn, symbol, '30mins', compact=True)
+    pxHistory_5mins = db.getPriceHistory(conn, symbol, '5mins', compact=True)
+    # full precision close for the momo optimizer, its saved results are tied to the exact closes optimizeMomo.py uses 
+    closeHistory = db.getPriceHistory(conn, symbol, '1day', withpctChange=False, columns=['symbol', 'close'])
 
 # load seasonality figures 
 overview_fig = seasonality.logReturns_overview_of_seasonality(symbol)
@@ -59,7 +61,7 @@ overview_ytd_fig = seasonality.logReturns_overview_of_seasonality(symbol, ytdlin
 logReturns_fig = plotReturns.plotReturnsAndPrice(symbol)
 
 # fetch top momo periods by fwdreturn correlation
-topr2 = momentum.getTopMomoPeriods(pxHistory, top=5)
+topr2 = momentum.getTopMomoPeriods(closeHistory, top=5)
 
 # get momo & sma(momo) for top periods  
 pxHistory = momentum.calcMomoFactor(pxHistory, lag=topr2['momoPeriod'][0])
@@ -0,0 +1,17 @@
+"""
+Optimizes momo vs. fwd return periods for every 1day symbol in the local db and saves them to the 
+analysis optimizations db, so main.py reads them instead of optimizing on the fly 
+
+    python optimizeMomo.py [numWorkers] [recalculate]
+"""
+import sys
+
+import config
+from impl import momentum
+
+if __name__ == '__main__':
+    numWorkers = config.momoOptimizer_numWorkers
+    if len(sys.argv) > 1 and sys.argv[1].isdigit():
+        numWorkers = int(sys.argv[1])
+
+    momentum.optimizeUniverse(numWorkers=numWorkers, recalculate='recalculate' in sys.argv[1:])
@@ -35,7 +35,7 @@ class Strategy:
 
     # load underlying history from db 
     def _load_underlying_pxhistory(self):
-        with db.sqlite_connection(config.dbname_stock) as conn:
+        with db.sqlite_connection(config.dbname_stock, readonly=True) as conn:
             return db.getPriceHistory(conn, self.symbol, '1day')
 
     """
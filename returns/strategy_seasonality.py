@@ -30,18 +30,14 @@ from interface import interface_localDB as db
 def strategy_monthToMonth(symbol, startMonth, endMonth, direction=1):
 
     # get price history
-    with db.sqlite_connection(config.dbname_stock) as conn:
+    with db.sqlite_connection(config.dbname_stock, readonly=True) as conn:
         try: 
-            history = db.getPriceHistory(conn, symbol, '1day', withpctChange=False)
+            # month, day, year columns for easier selection come from the calendar index 
+            history = db.getPriceHistory(conn, symbol, '1day', withpctChange=False, withCalendar=True)
         except:
             print(f'ERROR: Could not retrieve price history for {symbol}')
             exit()
 
-    ## add date columns for easier selection 
-    history['month'] = history['date'].dt.month
-    history['day'] = history['date'].dt.day
-    history['year'] = history['date'].dt.year
-
     ## Create a dataframe conssiting of trade open and close dates in sequence 
     tradeDates = pd.DataFrame(columns=['date'])
     # from history, get the earliest available year for the startMonth we want
@@ -93,19 +89,16 @@ def strategy_monthToMonth(symbol, startMonth, endMonth, direction=1):
 """
 def strategy_dayOfMonthSeasonality(symbol, startDay, endDay, direction=1): 
     # get price history
-    with db.sqlite_connection(config.dbname_stock) as conn:
+    with db.sqlite_connection(config.dbname_stock, readonly=True) as conn:
         try: 
-            history = db.getPriceHistory(conn, symbol, '1day', withpctChange=False)
+            # month, year columns for easier selection come from the calendar index 
+            history = db.getPriceHistory(conn, symbol, '1day', withpctChange=False, withCalendar=True)
         except:
             print(f'ERROR: Could not retrieve price history for {symbol}')
             exit()
 
-    ## add date columns for easier selection 
-    history['month'] = history['date'].dt.month
-    history['day'] = history['date'].dt.day
-    # convert day to business day of month 
-    history['day'] = history.apply(lambda x: utils.calculate_business_day_of_month(x), axis=1)
-    history['year'] = history['date'].dt.year
+    # day is the business day of month 
+    history['day'] = utils.calculate_business_days_of_month(history['date'])
     
     # make a list dates to open and close trades 
     history_startDates = history.groupby(['year', 'month'], group_keys=False).apply(utils.closest_day, startDay).reset_index() # get start dates
@@ -142,7 +135,7 @@ def plotResults(returns = [], benchmark='SPY'):#, returns2=pd.DataFrame(), retur
     if benchmark == '':
         benchmark = returns[0]['symbol'][0]
     history_underlying = pd.DataFrame()
-    with db.sqlite_connection(config.dbname_stock) as conn:
+    with db.sqlite_connection(config.dbname_stock, readonly=True) as conn:
         try: 
             history = db.getPriceHistory(conn, benchmark, '1day', withpctChange=False)
             if benchmark != returns[0]['symbol'][0]:
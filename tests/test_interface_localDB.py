@@ -0,0 +1,78 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+import config
+from interface import interface_barStore as barStore
+from interface import interface_localDB as db
+
+
+def _pxHistory(symbol, interval, dates, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(dates))))
+    return pd.DataFrame({'date': dates, 'open': close, 'high': close * 1.01, 'low': close * 0.99, 'close': close,
+                         'volume': rng.integers(1000, 5000, len(dates)).astype(float), 'symbol': symbol, 'interval': interval})
+
+
+def _stockDb(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'stock.db'))
+    # saveHistoryToDB keeps the lookup table of the db updated, it is expected to exist 
+    conn.execute('CREATE TABLE "00-lookup_symbolRecords" (name TEXT, symbol TEXT, interval TEXT, firstRecordDate TEXT, numMissingBusinessDays INTEGER)')
+    return conn
+
+
+def test_lookback_on_empty_table(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'usePxCache', False)
+    conn = sqlite3.connect(str(tmp_path / 'stock.db'))
+    pd.DataFrame(columns=['date', 'open', 'high', 'low', 'close', 'volume', 'symbol', 'interval']).to_sql('EMPTY_stock_1day', conn, index=False)
+
+    pxHistory = db.getPriceHistory(conn, 'EMPTY', '1day', lookback=10)
+
+    assert pxHistory.empty
+    assert db._resolveDateRange(conn, 'EMPTY_stock_1day', lookback=10) == (None, None)
+
+
+def test_incremental_seasonality_matches_full_fold(tmp_path):
+    conn = _stockDb(tmp_path)
+    dates = pd.date_range('2023-01-02 09:30', periods=3000, freq='30min').strftime('%Y-%m-%d %H:%M:%S')
+    history = _pxHistory('SPY', '30mins', dates)
+
+    # saved in batches, the accumulators are updated from the new records only 
+    for batch in np.array_split(np.arange(len(history)), [700, 701, 1900]):
+        db.saveHistoryToDB(history.iloc[batch].reset_index(drop=True), conn)
+
+    incremental = pd.read_sql('SELECT bucket, key, n, mean, m2 FROM "%s" WHERE tablename = ? ORDER BY bucket, key'%(db._seasonalityTable), conn, params=['SPY_stock_30mins'])
+    records = pd.read_sql('SELECT ROWID AS rid, epoch, close FROM "SPY_stock_30mins" ORDER BY epoch', conn)
+    full = db._seasonalityBatch(records).sort_values(by=['bucket', 'key']).reset_index(drop=True)
+
+    pd.testing.assert_frame_equal(incremental, full, check_dtype=False, rtol=0, atol=1e-12)
+
+
+def test_seasonality_rebuilds_when_older_records_are_saved(tmp_path):
+    conn = _stockDb(tmp_path)
+    history = _pxHistory('SPY', '1day', pd.bdate_range('2015-01-01', periods=1000).strftime('%Y-%m-%d'))
+
+    db.saveHistoryToDB(history.iloc[500:].reset_index(drop=True), conn)
+    db.saveHistoryToDB(history.iloc[:500].reset_index(drop=True), conn)
+
+    incremental = pd.read_sql('SELECT bucket, key, n, mean, m2 FROM "%s" WHERE tablename = ? ORDER BY bucket, key'%(db._seasonalityTable), conn, params=['SPY_stock_1day'])
+    records = pd.read_sql('SELECT ROWID AS rid, epoch, close FROM "SPY_stock_1day" ORDER BY epoch', conn)
+    full = db._seasonalityBatch(records).sort_values(by=['bucket', 'key']).reset_index(drop=True)
+
+    pd.testing.assert_frame_equal(incremental, full, check_dtype=False, rtol=0, atol=1e-12)
+
+
+def test_bar_store_export_of_unmigrated_table(tmp_path, monkeypatch):
+    monkeypatch.setattr(barStore, 'storeDir', str(tmp_path / 'barStore'))
+    conn = sqlite3.connect(str(tmp_path / 'stock.db'))
+    dates = pd.bdate_range('2021-01-04', '2022-12-30')
+    _pxHistory('SPY', '1day', dates.strftime('%Y-%m-%d')).to_sql('SPY_stock_1day', conn, index=False)
+
+    bars = db.getBars(conn, 'SPY', '1day')
+
+    np.testing.assert_array_equal(bars['epoch'], dates.to_numpy(dtype='datetime64[s]').astype('int64'))
+    assert sorted(barStore._readMeta('SPY', '1day')['years']) == [2021, 2022]
+    assert len(db.getBars(conn, 'SPY', '1day', start='2022-06-01')['epoch']) == len(dates[dates >= '2022-06-01'])
+    # exporting does not migrate the table 
+    assert 'epoch' not in [row[1] for row in conn.execute('PRAGMA table_info("SPY_stock_1day")')]
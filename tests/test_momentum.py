@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('matplotlib')
+pytest.importorskip('statsmodels')
+
+from impl import momentum
+
+
+def _close(numBars, seed=0):
+    rng = np.random.default_rng(seed)
+    return 100 * np.exp(np.cumsum(rng.normal(0, 0.01, numBars)))
+
+
+@pytest.mark.parametrize('numSaved', [50, 900])
+def test_incremental_momo_stats_match_full_recompute(numSaved):
+    close = _close(1000)
+    momoPeriods, fwdReturnPeriods = np.arange(1, 61), np.arange(1, 41)
+
+    stats = momentum._momoStats(close[:numSaved], momoPeriods, fwdReturnPeriods)
+    momentum._updateMomoStats(stats, close)
+    full = momentum._momoStats(close, momoPeriods, fwdReturnPeriods)
+
+    assert stats['numBars'] == full['numBars']
+    np.testing.assert_array_equal(stats['n'], full['n'])
+    np.testing.assert_allclose(momentum._correlationFromSums(stats), momentum._correlationFromSums(full), rtol=0, atol=1e-12)
+
+
+def test_correlation_grid_matches_pairwise_pearson():
+    close = _close(600, seed=1)
+    close[200] = np.nan
+    momoPeriods, fwdReturnPeriods = [5, 20], [3, 10]
+
+    grid = momentum._momoCorrelations([close], momoPeriods, fwdReturnPeriods).to_numpy().reshape(len(momoPeriods), len(fwdReturnPeriods))
+
+    for i, momoPeriod in enumerate(momoPeriods):
+        for j, fwdReturnPeriod in enumerate(fwdReturnPeriods):
+            momo = close / np.roll(close, momoPeriod) - 1
+            momo[:momoPeriod] = np.nan
+            fwdReturn = np.roll(close, -fwdReturnPeriod) / close - 1
+            fwdReturn[-fwdReturnPeriod:] = np.nan
+            valid = ~np.isnan(momo) & ~np.isnan(fwdReturn)
+            assert grid[i, j] == pytest.approx(np.corrcoef(momo[valid], fwdReturn[valid])[0, 1], abs=1e-12)
@@ -1,7 +1,10 @@
-import math
 import pandas as pd 
 import numpy as np
 
+from utils import utils_calendar as cal
+from utils import utils_returns as rt
+from utils import utils_seasonality as sz
+
 """ 
     This function returns the last business day for the given year and month
     inputs:
@@ -38,14 +41,8 @@ def aggregate_by_month(history, targetCol):
     # convert date column to datetime
     history['date'] = pd.to_datetime(history['date'])
 
-    # sort by date
-    history = history.sort_values(by='date')
-
-    # add month column
-    history['month'] = history['date'].dt.month
-
-    # group by month and get mean and sd of volume
-    aggregate_by_month = history.groupby('month')[targetCol].agg(['mean', 'std']).reset_index()
+    # mean and sd per month, see utils_seasonality.Seasonality
+    aggregate_by_month = sz.Seasonality(history, targetCol, bucketNames=['month'], subsetNames=['all']).get('month')
 
     return aggregate_by_month
 
@@ -65,18 +62,8 @@ def aggregate_by_dayOfMonth(history, targetCol):
     # convert date column to datetime
     history['date'] = pd.to_datetime(history['date'])
 
-    # sort by date
-    history = history.sort_values(by='date')
-
-    # add month column
-    #history['dayOfMonth'] = history['date'].dt.day
-
-    # add column business_day_of_month, which is the business day of the month represented by the date
-    # Apply the function to each row
-    history['dayOfMonth'] = history.apply(lambda row: calculate_business_day_of_month(row, holidays=[]), axis=1)
-
-    # group by month and get mean and sd of volume
-    aggregate_by_dayOfMonth = history.groupby('dayOfMonth')[targetCol].agg(['mean', 'std']).reset_index()
+    # mean and sd per business day of the month, non business days are left out
+    aggregate_by_dayOfMonth = sz.Seasonality(history, targetCol, bucketNames=['dayOfMonth'], subsetNames=['all']).get('dayOfMonth')
 
     return aggregate_by_dayOfMonth
 
@@ -96,14 +83,8 @@ def aggregate_by_dayOfWeek(history, targetCol):
     # convert date column to datetime
     history['date'] = pd.to_datetime(history['date'])
 
-    # sort by date
-    history = history.sort_values(by='date')
-
-    # add month column
-    history['dayOfWeek'] = history['date'].dt.dayofweek
-
-    # group by month and get mean and sd of volume
-    aggregate_by_dayOfWeek = history.groupby('dayOfWeek')[targetCol].agg(['mean', 'std']).reset_index()
+    # mean and sd per day of week
+    aggregate_by_dayOfWeek = sz.Seasonality(history, targetCol, bucketNames=['dayOfWeek'], subsetNames=['all']).get('dayOfWeek')
 
     return aggregate_by_dayOfWeek
 
@@ -121,16 +102,44 @@ def aggregate_by_timestamp(history, targetCol):
     if history['date'].dtype != 'datetime64[ns]':
         history['date'] = pd.to_datetime(history['date'])
 
-    # sort by date
-    history = history.sort_values(by='date')
+    # mean and sd per minute of day, labelled HH:MM
+    aggregate_by_timestamp = sz.Seasonality(history, targetCol, bucketNames=['timestamp'], subsetNames=['all']).get('timestamp')
+
+    return aggregate_by_timestamp
+
+"""
+    Same as aggregate_by_timestamp, over px history passed in as chunks (see interface_localDB.iterPriceHistory) 
+    so the full history never has to be in memory
+    inputs:
+        - chunks - iterable of dataframes with a datetime date column 
+        - targetCol - column to aggregate 
+    output:
+        - dataframe of timestamp, mean, std
+"""
+def aggregate_by_timestamp_chunked(chunks, targetCol):
+    aggregate = None
+    for chunk in chunks:
+        minutes = cal.attachCalendar(chunk[['date']].copy())['minuteOfDay']
+        stats = chunk.groupby(minutes)[targetCol].agg(['count', 'mean', 'var'])
+        stats['m2'] = stats['var'].fillna(0) * (stats['count'] - 1)
+        stats = stats[['count', 'mean', 'm2']]
+
+        if aggregate is None:
+            aggregate = stats
+            continue
 
-    # add month column
-    history['timestamp'] = history['date'].dt.strftime('%H:%M:%S')
+        # merge the chunk's count, mean and sum of squared deviations into the running totals 
+        aggregate, stats = aggregate.align(stats, join='outer', fill_value=0)
+        count, mean, m2 = sz.mergeMoments(*(aggregate[column].to_numpy(dtype='float64') for column in ['count', 'mean', 'm2']), *(stats[column].to_numpy(dtype='float64') for column in ['count', 'mean', 'm2']))
+        aggregate = pd.DataFrame({'count': count, 'mean': mean, 'm2': m2}, index=aggregate.index)
 
-    # group by timestamp and get mean and sd of volume
-    aggregate_by_timestamp = history.groupby('timestamp')[targetCol].agg(['mean', 'std']).reset_index()
+    if aggregate is None:
+        return pd.DataFrame(columns=['timestamp', 'mean', 'std'])
 
-    return aggregate_by_timestamp
+    aggregate = aggregate.sort_index()
+    aggregate.index = cal.formatMinuteOfDay(aggregate.index)
+    aggregate['mean'], aggregate['std'] = sz.finalizeMoments(aggregate['count'], aggregate['mean'], aggregate['m2'])
+    return aggregate[['mean', 'std']].rename_axis('timestamp').reset_index()
 
 """
     This function calculates log returns on the passed in values 
@@ -144,25 +153,28 @@ def aggregate_by_timestamp(history, targetCol):
 """
 def calcLogReturns(history, colName, lag=1, direction=1):
     # calculate log returns 
-    if direction == 1:
-        history['logReturn'] = (history[colName].apply(lambda x: math.log(x)) - history[colName].shift(lag).apply(lambda x: math.log(x))).round(5)
-    elif direction == -1:
-        history['logReturn'] = (history[colName].apply(lambda x: math.log(x)) - history[colName].shift(lag).apply(lambda x: math.log(x))).round(5)
-        history['logReturn'] = history['logReturn'] * -1  
+    if direction in (1, -1):
+        history = rt.calcReturns(history, colName, lags=lag, kind='log', direction=direction, names=['logReturn'], decimals=5)
     return history.reset_index(drop=True)
 
-# Function to calculate business days of the month
+"""
+    Returns the business day of the month of every date, counting weekdays that are not holidays from 1 
+    inputs:
+        - dates: series or array of datetimes
+        - holidays: list of 'YYYY-MM-DD' exchange holidays, defaults to config._exchangeHolidays
+    output:
+        - float array aligned with dates, NaN for dates that are not business days
+"""
+def calculate_business_days_of_month(dates, holidays=None):
+    # the calendar index counts business days per (year, month) once, dates are looked up by day number 
+    calendar = cal.attachCalendar(pd.DataFrame({'date': np.asarray(dates, dtype='datetime64[ns]')}), holidays=holidays)
+    businessDayOfMonth = calendar['businessDayOfMonth'].to_numpy(dtype='float64')
+    businessDayOfMonth[businessDayOfMonth == 0] = np.nan
+    return businessDayOfMonth
+
+# Function to calculate business days of the month, for a single row, see calculate_business_days_of_month()
 def calculate_business_day_of_month(row, holidays=[]):
-    # Start and end of month
-    start_of_month = row['date'].replace(day=1)
-    end_of_month = start_of_month + pd.offsets.MonthEnd(1)
-    
-    # Generate business days for the month, excluding weekends and optionally holidays
-    business_days = pd.bdate_range(start=start_of_month, end=end_of_month, freq='B', holidays=holidays)
-    
-    # Calculate business day of the month
-    business_day_of_month = np.where(business_days == row['date'])[0] + 1  # +1 because we want the count to start from 1
-    return business_day_of_month[0] if business_day_of_month.size > 0 else np.nan
+    return calculate_business_days_of_month([row['date']], holidays=holidays)[0]
 
 
 """
@@ -0,0 +1,98 @@
+"""
+Calendar index shared by the data layer and the seasonality code
+
+    - one row per calendar day: year, month, day, dayOfWeek, businessDayOfMonth, holiday as int8/int16 keys
+    - built once per process over the range of dates seen so far, and extended when a later frame needs more days
+    - attachCalendar() joins it onto px history by integer day number, together with minuteOfDay and the session flag
+"""
+import numpy as np
+import pandas as pd
+
+import config
+
+""" Global vars """
+_calendar = None # (firstDay, holidays, DataFrame) of the cached calendar index
+
+calendarDtypes = {'year': 'int16', 'month': 'int8', 'day': 'int8', 'dayOfWeek': 'int8', 'businessDayOfMonth': 'int8', 'holiday': 'bool'}
+calendarColumns = list(calendarDtypes)
+
+""" returns the minute of day of a 'HH:MM' string """
+def minuteOfDay(timeOfDay):
+    hours, minutes = timeOfDay.split(':')[:2]
+    return int(hours) * 60 + int(minutes)
+
+"""
+    Returns the calendar index covering the passed in day numbers (days since 1970-01-01)
+    inputs:
+        - firstDay, lastDay: int day numbers
+        - holidays: list of 'YYYY-MM-DD' exchange holidays, defaults to config._exchangeHolidays
+    output:
+        - (firstDay of the index, DataFrame with one row per day and calendarColumns)
+        - businessDayOfMonth counts weekdays that are not holidays from 1, it is 0 on weekends and holidays
+"""
+def getCalendar(firstDay, lastDay, holidays=None):
+    global _calendar
+    holidays = tuple(sorted(config._exchangeHolidays if holidays is None else holidays))
+
+    if _calendar is not None and _calendar[1] == holidays:
+        cachedFirstDay, _, calendar = _calendar
+        if cachedFirstDay <= firstDay and lastDay < cachedFirstDay + len(calendar):
+            return cachedFirstDay, calendar
+        # extend the cached range instead of building one calendar per frame
+        firstDay = min(firstDay, cachedFirstDay)
+        lastDay = max(lastDay, cachedFirstDay + len(calendar) - 1)
+
+    # whole months, so business days are counted from the 1st
+    start = pd.Timestamp(np.datetime64(int(firstDay), 'D')).replace(day=1)
+    end = pd.Timestamp(np.datetime64(int(lastDay), 'D')) + pd.offsets.MonthEnd(0)
+    days = pd.date_range(start, end, freq='D')
+
+    calendar = pd.DataFrame({
+        'year': days.year.astype('int16'),
+        'month': days.month.astype('int8'),
+        'day': days.day.astype('int8'),
+        'dayOfWeek': days.dayofweek.astype('int8'),
+        'holiday': days.isin(pd.to_datetime(list(holidays))),
+    })
+    isBusinessDay = (calendar['dayOfWeek'] < 5) & ~calendar['holiday']
+    monthKey = calendar['year'].astype('int32') * 12 + calendar['month']
+    calendar['businessDayOfMonth'] = (isBusinessDay.astype('int8').groupby(monthKey).cumsum() * isBusinessDay).astype('int8')
+    calendar = calendar[calendarColumns]
+
+    firstDay = int(days[0].to_datetime64().astype('datetime64[D]').astype('int64'))
+    _calendar = (firstDay, holidays, calendar)
+    return firstDay, calendar
+
+"""
+    Adds calendar key columns to px history, joined from the calendar index by integer day number
+    inputs:
+        - pxHistory: dataframe with a datetime date column
+        - sessionHours: ('HH:MM', 'HH:MM') [open, close) for the inSession flag, defaults to config._sessionHours
+        - holidays: list of 'YYYY-MM-DD' exchange holidays, defaults to config._exchangeHolidays
+    output:
+        - pxHistory with calendarColumns, minuteOfDay (int16) and inSession (bool) added
+"""
+def attachCalendar(pxHistory, sessionHours=None, holidays=None):
+    sessionHours = config._sessionHours if sessionHours is None else sessionHours
+    dates = pxHistory['date'].to_numpy(dtype='datetime64[ns]')
+    dayNumbers = dates.astype('datetime64[D]')
+
+    if len(dates):
+        firstDay, calendar = getCalendar(dayNumbers.min().astype('int64'), dayNumbers.max().astype('int64'), holidays)
+        rows = dayNumbers.astype('int64') - firstDay
+        for column in calendarColumns:
+            pxHistory[column] = calendar[column].to_numpy()[rows]
+    else:
+        for column, dtype in calendarDtypes.items():
+            pxHistory[column] = pd.Series(dtype=dtype)
+
+    minutes = ((dates - dayNumbers) // np.timedelta64(1, 'm')).astype('int16')
+    pxHistory['minuteOfDay'] = minutes
+    pxHistory['inSession'] = (minutes >= minuteOfDay(sessionHours[0])) & (minutes < minuteOfDay(sessionHours[1]))
+
+    return pxHistory
+
+""" returns 'HH:MM:SS' labels of minute of day keys """
+def formatMinuteOfDay(minutes):
+    minutes = np.asarray(minutes, dtype='int64')
+    return pd.Index(['%02d:%02d:00'%(minute // 60, minute % 60) for minute in minutes])
@@ -2,9 +2,10 @@
 Util functionsion specific to dealing with futures contracts 
 """
 
-import interface_localDB as db
 import pandas as pd
 
+from interface import interface_localDB as db
+
 """
     Function that returns the close price
 """
@@ -30,19 +31,14 @@ def getRawTermstructure(conn, symbol, lookback=100, numMonths=8):
     # select just the records where lastTradeMonth is between currentdate in format YYYYMM + 1 month, and currentdate + numMonths months 
     lookupTable = lookupTable[(lookupTable['lastTradeMonth'] >= expiryString) & (lookupTable['lastTradeMonth'] <= (pd.to_datetime('today') + pd.DateOffset(months=numMonths)).strftime('%Y%m'))].reset_index(drop=True)
 
-    ts = pd.DataFrame()
+    # just the daily contracts of the target symbol, nearest expiry first 
+    lookupTable = lookupTable[(lookupTable['symbol'] == symbol.upper()) & (lookupTable['interval'] == '1day')].sort_values('lastTradeMonth').reset_index(drop=True)
+    if lookupTable.empty:
+        return pd.DataFrame()
 
-    ## iterate through the lookup table getting px history for each contract 
-    for index, row in lookupTable.iterrows():
-        if ts.empty:
-            ts = db.getPriceHistoryWithTablename(conn, row['name'])
-            # drop all columns other than date and close, rename the close column to close_lastTradeMonth
-            ts = ts[['date', 'close']].rename(columns={'close': 'close_' + row['lastTradeMonth']})
-        else:
-            record = db.getPriceHistoryWithTablename(conn, row['name'])
-            # join record with ts on 'date' and only include the 'close' column renaming it to close_lastTradeMonth 
-            record = record[['date', 'close']].rename(columns={'close': 'close_' + row['lastTradeMonth']})
-            ts = ts.merge(record, on='date', how='left')
+    ## fetch date, close of every contract in one query, one column per contract named close_lastTradeMonth 
+    ts = db.getCloseMatrix(conn, lookupTable['name'])
+    ts.columns = ['date'] + ['close_' + lastTradeMonth for lastTradeMonth in lookupTable['lastTradeMonth']]
     
     # drop rows in ts where any of the columns has a NaN value
     ts = ts.dropna(axis=0, how='any').reset_index(drop=True)
@@ -0,0 +1,94 @@
+"""
+Vectorized return calculations on numpy arrays
+
+    - log and simple returns for several lags in one call, written into one preallocated (rows x lags) block
+    - positive lags are trailing returns (value[t] vs value[t-lag]), negative lags are forward returns (value[t+lag] vs value[t])
+    - direction 1 = long, -1 = short
+"""
+import numpy as np
+import pandas as pd
+
+""" returns lags as a tuple, and whether a single lag was passed in """
+def _asLags(lags):
+    if np.ndim(lags) == 0:
+        return (int(lags),), True
+    return tuple(int(lag) for lag in lags), False
+
+def _returns(values, lags, direction, out, log):
+    lags, single = _asLags(lags)
+    values = np.asarray(values, dtype='float64')
+    if out is None:
+        out = np.empty((len(values), len(lags)))
+    block = out.reshape(len(values), len(lags))
+
+    # logs are taken once for all lags 
+    with np.errstate(divide='ignore', invalid='ignore'):
+        base = np.log(np.where(values > 0, values, np.nan)) if log else values
+
+        for i, lag in enumerate(lags):
+            column = block[:, i]
+            column[:] = np.nan
+            if lag == 0 or abs(lag) >= len(values):
+                continue
+            if lag > 0:
+                current, previous = base[lag:], base[:-lag]
+                target = column[lag:]
+            else:
+                current, previous = base[-lag:], base[:lag]
+                target = column[:lag]
+            if log:
+                np.subtract(current, previous, out=target)
+            else:
+                np.divide(current, previous, out=target)
+                target -= 1
+
+    if direction == -1:
+        block *= -1
+
+    return block[:, 0] if single else block
+
+"""
+    Returns log returns of values
+    inputs:
+        - values: 1d array
+        - lags: int or list of ints, positive = trailing, negative = forward returns
+        - direction: 1 = long, -1 = short
+        - out: optional preallocated float64 array of shape (len(values),) or (len(values), len(lags)) to write into
+    output:
+        - 1d array for a single lag, otherwise (rows x lags) array, NaN where the lag runs off the data
+"""
+def logReturns(values, lags=1, direction=1, out=None):
+    return _returns(values, lags, direction, out, log=True)
+
+"""
+    Returns simple returns (pct change) of values, see logReturns() for inputs
+"""
+def simpleReturns(values, lags=1, direction=1, out=None):
+    return _returns(values, lags, direction, out, log=False)
+
+"""
+    Adds return columns to history, one per lag
+    inputs:
+        - history: dataframe
+        - colName: column to calculate returns on
+        - lags: int or list of ints, see logReturns()
+        - kind: 'log' or 'simple'
+        - direction: 1 = open long, -1 = open short
+        - names: column names to write, one per lag, defaults to '<kind>Return<lag>'
+        - decimals: optional, round returns to this many decimals
+    output:
+        - history with the return columns added
+"""
+def calcReturns(history, colName='close', lags=1, kind='log', direction=1, names=None, decimals=None):
+    lags, _ = _asLags(lags)
+    if names is None:
+        names = ['%sReturn%s'%(kind, lag) for lag in lags]
+
+    compute = logReturns if kind == 'log' else simpleReturns
+    block = compute(history[colName].to_numpy(), lags, direction=direction)
+    if decimals is not None:
+        block = block.round(decimals)
+    for i, name in enumerate(names):
+        history[name] = block[:, i]
+
+    return history
@@ -0,0 +1,126 @@
+"""
+Single pass seasonality statistics
+
+    - every bucketing (month, business day of month, day of week, time of day) is an integer key from the calendar index
+    - means and standard deviations per bucket are bincount sums over the keys, no groupby
+    - subsets (all history, current year, session hours) are boolean masks over the same sorted frame
+    - the result object is computed once and read by every plot that needs it
+"""
+import numpy as np
+import pandas as pd
+
+from utils import utils_calendar as cal
+
+# bucket name -> (calendar key column, name of the bucket column in the aggregate, smallest valid key)
+buckets = {
+    'month': ('month', 'month', 1),
+    'dayOfMonth': ('businessDayOfMonth', 'dayOfMonth', 1), # 0 = not a business day
+    'dayOfWeek': ('dayOfWeek', 'dayOfWeek', 0),
+    'timestamp': ('minuteOfDay', 'timestamp', 0),
+}
+
+subsets = ['all', 'currentYear', 'session', 'sessionCurrentYear']
+
+"""
+Returns count, mean and sum of squared deviations from the mean (M2) of values per integer key, 
+for the keys that have at least one value
+
+Params
+===========
+keys - [int array] non negative bucket keys 
+values - [float array] values without NaNs, same length as keys
+
+"""
+def bucketMoments(keys, values):
+    counts = np.bincount(keys)
+    sums = np.bincount(keys, weights=values, minlength=len(counts))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = sums / counts
+    m2 = np.bincount(keys, weights=(values - means[keys])**2, minlength=len(counts))
+    present = np.flatnonzero(counts)
+    return present, counts[present], means[present], m2[present]
+
+"""
+Merges two sets of moments of the same buckets with the parallel form of Welford's update, 
+buckets missing from one of the sets have a count of 0 in it
+
+Params
+===========
+counts, means, m2 - [float arrays] moments of the first set, see bucketMoments() 
+otherCounts, otherMeans, otherM2 - [float arrays] moments of the second set 
+
+"""
+def mergeMoments(counts, means, m2, otherCounts, otherMeans, otherM2):
+    merged = counts + otherCounts
+    delta = otherMeans - means
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weight = np.where(merged > 0, otherCounts / merged, 0)
+    return merged, means + delta * weight, m2 + otherM2 + delta**2 * counts * weight
+
+"""
+Returns the mean and sample standard deviation of buckets from their moments, like pandas: 
+NaN mean for empty buckets, NaN std for buckets with a single value 
+"""
+def finalizeMoments(counts, means, m2):
+    counts = np.asarray(counts, dtype='float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stds = np.sqrt(np.asarray(m2, dtype='float64') / (counts - 1))
+    stds[counts < 2] = np.nan
+    return np.where(counts > 0, means, np.nan), stds
+
+class Seasonality:
+    """
+        Mean and std of a column per calendar bucket, for several subsets of the history at once
+
+        inputs:
+            pxHistory: dataframe with a datetime date column and targetCol
+            targetCol: str, column to aggregate
+            bucketNames: [str] keys of buckets to compute
+            subsetNames: [str] subsets to compute, see subsets
+            sessionHours: ('HH:MM', 'HH:MM') optional session for the session subsets, defaults to config._sessionHours
+    """
+    def __init__(self, pxHistory, targetCol='logReturn', bucketNames=list(buckets), subsetNames=subsets, sessionHours=None):
+        self.targetCol = targetCol
+
+        # one sort and one calendar join for every bucketing
+        history = pxHistory[['date', targetCol]].copy()
+        if not pd.api.types.is_datetime64_any_dtype(history['date']):
+            history['date'] = pd.to_datetime(history['date'])
+        if not history['date'].is_monotonic_increasing:
+            history = history.sort_values(by='date')
+        history = cal.attachCalendar(history, sessionHours=sessionHours)
+
+        values = history[targetCol].to_numpy(dtype='float64')
+        valid = ~np.isnan(values)
+        year = history['year'].to_numpy()
+        inSession = history['inSession'].to_numpy()
+        currentYear = year == year.max() if len(year) else np.zeros(0, dtype=bool)
+        masks = {'all': valid, 'currentYear': valid & currentYear, 'session': valid & inSession, 'sessionCurrentYear': valid & inSession & currentYear}
+
+        self._aggregates = {}
+        for bucketName in bucketNames:
+            keyColumn, _, minKey = buckets[bucketName]
+            keys = history[keyColumn].to_numpy().astype('int64')
+            for subsetName in subsetNames:
+                mask = masks[subsetName] & (keys >= minKey)
+                self._aggregates[(bucketName, subsetName)] = self._aggregate(bucketName, keys[mask], values[mask])
+
+    """ mean and sample std per key, see bucketMoments() """
+    def _aggregate(self, bucketName, keys, values):
+        _, bucketColumn, _ = buckets[bucketName]
+        present, counts, means, m2 = bucketMoments(keys, values)
+        means, stds = finalizeMoments(counts, means, m2)
+
+        aggregate = pd.DataFrame({bucketColumn: present, 'mean': means, 'std': stds})
+        if bucketName == 'timestamp':
+            aggregate[bucketColumn] = cal.formatMinuteOfDay(present)
+        return aggregate
+
+    """
+        returns the aggregate of a bucketing as a dataframe of [bucket, mean, std], the same as utils.aggregate_by_*
+        inputs:
+            bucketName: str, one of buckets
+            subsetName: str, one of subsets
+    """
+    def get(self, bucketName, subsetName='all'):
+        return self._aggregates[(bucketName, subsetName)].copy()
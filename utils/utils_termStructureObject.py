@@ -1,9 +1,10 @@
 import pandas as pd
 import seaborn as sns
-import sqlite3
 import config
 import utils
 
+from interface import interface_localDB as db
+
 class TermStructure:
     def __init__(self, symbol, interval, symbol_underlying):
         self.dbPath_termStructure = config.dbname_termstructure
@@ -19,8 +20,7 @@ class TermStructure:
     def get_raw_term_structure(self):
         symbol = self.symbol.upper()
         tablename = f'{symbol}_{self.interval}'
-        #with db.sqlite_connection(config.dbname_stock) as conn:
-        with sqlite3.connect(self.dbPath_termStructure) as conn:
+        with db.sqlite_connection(self.dbPath_termStructure, readonly=True) as conn:
             ts_raw = pd.read_sql(f'SELECT * FROM {tablename}', conn)
         ts_raw['date'] = pd.to_datetime(ts_raw['date'])
         ts_raw['symbol'] = symbol
@@ -33,7 +33,7 @@ class TermStructure:
             type = 'index'
         else:
             type = 'stock'
-        with sqlite3.connect(config.dbname_stock) as conn:
+        with db.sqlite_connection(config.dbname_stock, readonly=True) as conn:
             underlying_pxhistory = pd.read_sql(f'SELECT * FROM {self.symbol_underlying}_{type}_{self.interval}', conn)
         underlying_pxhistory['date'] = pd.to_datetime(underlying_pxhistory['date'])
         underlying_pxhistory.set_index('date', inplace=True)